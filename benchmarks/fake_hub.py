@@ -0,0 +1,181 @@
+"""In-process fake PowerView hub.
+
+Serves generated shades, rooms, scenes and scene members over http on
+localhost. Every request can be delayed and a fraction of the requests
+fails, to mimic a busy hub.
+"""
+
+import asyncio
+import base64
+import random
+
+from aiohttp import web
+
+SHADE_TYPES = (5, 6, 8, 18, 23)
+
+
+def encode_name(name) -> str:
+    return base64.b64encode(name.encode()).decode()
+
+
+class FakeHub:
+    """Fake hub with generated hub data.
+
+    :param shades: Number of shades.
+    :param rooms: Number of rooms. Defaults to one per ten shades.
+    :param scenes: Number of scenes. Defaults to one per two shades.
+    :param scene_members: Number of scene members. Defaults to the number
+        of shades.
+    :param latency: Seconds every response is delayed.
+    :param error_rate: Fraction of the requests answered with an error.
+    """
+
+    def __init__(
+        self,
+        shades=10,
+        rooms=None,
+        scenes=None,
+        scene_members=None,
+        latency=0,
+        error_rate=0,
+        seed=1,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        rooms = rooms if rooms is not None else max(1, shades // 10)
+        scenes = scenes if scenes is not None else max(1, shades // 2)
+        scene_members = scene_members if scene_members is not None else shades
+        self.rooms = [
+            {"id": 1000 + _idx, "name": encode_name("Room {}".format(_idx))}
+            for _idx in range(rooms)
+        ]
+        self.shades = [
+            {
+                "id": 1 + _idx,
+                "name": encode_name("Shade {}".format(_idx)),
+                "roomId": self.rooms[_idx % rooms]["id"],
+                "type": SHADE_TYPES[_idx % len(SHADE_TYPES)],
+                "batteryStrength": 180,
+                "positions": {"posKind1": 1, "position1": 0},
+            }
+            for _idx in range(shades)
+        ]
+        self.scenes = [
+            {
+                "id": 20000 + _idx,
+                "name": encode_name("Scene {}".format(_idx)),
+                "roomId": self.rooms[_idx % rooms]["id"],
+                "networkNumber": _idx,
+            }
+            for _idx in range(scenes)
+        ]
+        self.scene_members = [
+            {
+                "id": 30000 + _idx,
+                "sceneId": self.scenes[_idx % scenes]["id"],
+                "shadeId": self.shades[_idx % shades]["id"] if shades else 0,
+                "positions": {"posKind1": 1, "position1": 65535},
+            }
+            for _idx in range(scene_members)
+        ]
+        self._runner = None
+        self.address = None
+
+    @property
+    def user_data(self):
+        return {
+            "userData": {
+                "hubName": encode_name("Fake hub"),
+                "serialNumber": "FAKE0001",
+                "ip": "127.0.0.1",
+            }
+        }
+
+    async def _respond(self, data):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            raise web.HTTPServiceUnavailable()
+        return web.json_response(data)
+
+    def _find(self, items, request):
+        _id = int(request.match_info["id"])
+        for _item in items:
+            if _item["id"] == _id:
+                return _item
+        raise web.HTTPNotFound()
+
+    async def _shades(self, request):
+        return await self._respond(
+            {
+                "shadeIds": [_s["id"] for _s in self.shades],
+                "shadeData": self.shades,
+            }
+        )
+
+    async def _shade(self, request):
+        return await self._respond({"shade": self._find(self.shades, request)})
+
+    async def _move_shade(self, request):
+        shade = self._find(self.shades, request)
+        data = (await request.json()).get("shade", {})
+        if "positions" in data:
+            shade["positions"] = data["positions"]
+        return await self._respond({"shade": shade})
+
+    async def _rooms(self, request):
+        return await self._respond(
+            {
+                "roomIds": [_r["id"] for _r in self.rooms],
+                "roomData": self.rooms,
+            }
+        )
+
+    async def _scenes(self, request):
+        if "sceneId" in request.query:
+            return await self._respond({"scene": {"shadeIds": []}})
+        return await self._respond(
+            {
+                "sceneIds": [_s["id"] for _s in self.scenes],
+                "sceneData": self.scenes,
+            }
+        )
+
+    async def _scene_members(self, request):
+        return await self._respond({"sceneMemberData": self.scene_members})
+
+    async def _userdata(self, request):
+        return await self._respond(self.user_data)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/shades", self._shades)
+        app.router.add_get("/api/shades/{id}", self._shade)
+        app.router.add_put("/api/shades/{id}", self._move_shade)
+        app.router.add_get("/api/rooms", self._rooms)
+        app.router.add_get("/api/scenes", self._scenes)
+        app.router.add_get("/api/scenemembers", self._scene_members)
+        app.router.add_get("/api/userdata", self._userdata)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0) -> str:
+        """Start serving.
+
+        :return: The hub address, usable as hub ip."""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.address = "{}:{}".format(host, port)
+        return self.address
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
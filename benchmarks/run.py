@@ -0,0 +1,319 @@
+"""Benchmark suite.
+
+Runs the hub cache, lookups, table rendering, discovery and bulk
+operations against a fake hub at several scales. Usage::
+
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --baseline baseline.json
+
+The request rate limit is lifted so the client side is measured, not
+the limiter.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import math
+import sys
+import time
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+import aiohttp
+from prompt_toolkit.layout.screen import Size
+from prompt_toolkit.output.defaults import (
+    get_default_output,
+    set_default_output,
+)
+from prompt_toolkit.output.vt100 import Vt100_Output
+
+from benchmarks.fake_hub import FakeHub
+from pv_prompt import bulk
+from pv_prompt.discovery import SubnetScanner
+from pv_prompt.print_output import print_dicts, print_scenes, print_shade_data
+from pv_prompt.resource_cache import HubCache
+from pv_prompt.scheduler import ScheduledRequest
+from pv_prompt.stats import transfer_trace
+
+DEFAULT_SCALES = (10, 100, 1000)
+DEFAULT_REPEAT = 3
+# A result slower than baseline times this factor is a regression.
+DEFAULT_THRESHOLD = 1.25
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """Register a benchmark.
+
+    A benchmark is a coroutine function called with a `Context` which
+    returns the measured duration in seconds."""
+
+    def _register(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return _register
+
+
+class Context:
+    """A running fake hub and a hub cache filled from it."""
+
+    def __init__(self, loop, scale, latency=0, error_rate=0):
+        self.loop = loop
+        self.scale = scale
+        self.hub = FakeHub(scale, latency=latency, error_rate=error_rate)
+        self.websession = None
+        self.hub_cache = None
+
+    def request(self):
+        return ScheduledRequest(
+            self.hub.address,
+            loop=self.loop,
+            websession=self.websession,
+            rate=1e6,
+            burst=1e6,
+        )
+
+    async def __aenter__(self):
+        await self.hub.start()
+        self.websession = aiohttp.ClientSession(
+            trace_configs=[transfer_trace()]
+        )
+        self.hub_cache = HubCache(self.request(), self.loop)
+        await self.hub_cache.update(quiet=True)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.hub_cache.request.stop()
+        await self.websession.close()
+        await self.hub.stop()
+
+
+class _CapturedOutput:
+    """Render output to memory instead of the terminal."""
+
+    def __enter__(self):
+        self._previous = get_default_output()
+        self.stream = io.StringIO()
+        self._redirect = contextlib.redirect_stdout(self.stream)
+        self._redirect.__enter__()
+        set_default_output(
+            Vt100_Output(
+                self.stream,
+                lambda: Size(rows=40, columns=120),
+                write_binary=False,
+            )
+        )
+        return self
+
+    def __exit__(self, *exc):
+        set_default_output(self._previous)
+        self._redirect.__exit__(*exc)
+
+
+@benchmark("hub_cache_update")
+async def hub_cache_update(context):
+    hub_cache = HubCache(context.request(), context.loop)
+    start = time.perf_counter()
+    await hub_cache.update(quiet=True)
+    duration = time.perf_counter() - start
+    hub_cache.request.stop()
+    return duration
+
+
+@benchmark("find_by_id")
+async def find_by_id(context):
+    """Look up every shade id 100 times."""
+    shades = context.hub_cache.shades
+    ids = [_shade.id for _shade in shades] * 100
+    start = time.perf_counter()
+    for _id in ids:
+        shades.find_by_id(_id)
+    return time.perf_counter() - start
+
+
+@benchmark("print_scenes")
+async def render_scenes(context):
+    with _CapturedOutput():
+        start = time.perf_counter()
+        print_scenes(context.hub_cache.scenes, context.hub_cache.rooms)
+        return time.perf_counter() - start
+
+
+@benchmark("print_shade_data")
+async def render_shades(context):
+    with _CapturedOutput():
+        start = time.perf_counter()
+        print_shade_data(context.hub_cache.shades.resources)
+        return time.perf_counter() - start
+
+
+@benchmark("print_dicts")
+async def render_raw(context):
+    """Print the raw data of every shade, as in verbose mode."""
+    with _CapturedOutput():
+        start = time.perf_counter()
+        print_dicts(_shade.raw_data for _shade in context.hub_cache.shades)
+        return time.perf_counter() - start
+
+
+@benchmark("subnet_scan")
+async def subnet_scan(context):
+    """Scan a localhost network with at least `scale` addresses."""
+    host, port = context.hub.address.split(":")
+    prefix = 32 - math.ceil(math.log2(context.scale + 2))
+    scanner = SubnetScanner(lambda hub: None, timeout=1, port=int(port))
+    start = time.perf_counter()
+    hubs = await scanner.scan("{}/{}".format(host, prefix))
+    duration = time.perf_counter() - start
+    assert [_hub.ip for _hub in hubs] == [host]
+    return duration
+
+
+@benchmark("bulk_open")
+async def bulk_open(context):
+    shades = list(context.hub_cache.shades)
+    start = time.perf_counter()
+    await bulk.open_shades(shades)
+    return time.perf_counter() - start
+
+
+def run(
+    scales=DEFAULT_SCALES, repeat=DEFAULT_REPEAT, names=None, **hub_options
+):
+    """Run the benchmarks.
+
+    :return: {benchmark: {scale: best duration in seconds}}
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = OrderedDict()
+
+    async def _run(scale):
+        async with Context(loop, scale, **hub_options) as context:
+            for name, func in BENCHMARKS.items():
+                if names and name not in names:
+                    continue
+                durations = [await func(context) for _ in range(repeat)]
+                results.setdefault(name, OrderedDict())[str(scale)] = min(
+                    durations
+                )
+
+    try:
+        for scale in scales:
+            loop.run_until_complete(_run(scale))
+    finally:
+        loop.close()
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD) -> list:
+    """Compare results with a baseline.
+
+    :return: (name, scale, seconds, baseline seconds, ratio) of every
+        result slower than the baseline times `threshold`.
+    """
+    regressions = []
+    for name, scales in results.items():
+        for scale, seconds in scales.items():
+            previous = baseline.get(name, {}).get(scale)
+            if previous and seconds / previous > threshold:
+                regressions.append(
+                    (name, scale, seconds, previous, seconds / previous)
+                )
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(
+        "{:<20}{:>8}{:>14}{:>14}{:>8}".format(
+            "BENCHMARK", "SCALE", "TIME", "BASE", "X"
+        )
+    )
+    for name, scales in results.items():
+        for scale, seconds in scales.items():
+            previous = (baseline or {}).get(name, {}).get(scale)
+            print(
+                "{:<20}{:>8}{:>11.3f} ms{}{}".format(
+                    name,
+                    scale,
+                    seconds * 1000,
+                    (
+                        "{:>11.3f} ms".format(previous * 1000)
+                        if previous
+                        else " " * 14
+                    ),
+                    "{:>8.2f}".format(seconds / previous) if previous else "",
+                )
+            )
+
+
+def main(argv=None):
+    argparser = ArgumentParser(description="Run the pv_prompt benchmarks.")
+    argparser.add_argument(
+        "--scales",
+        default=",".join(str(_scale) for _scale in DEFAULT_SCALES),
+        help="Comma separated numbers of shades. default is %(default)s",
+    )
+    argparser.add_argument(
+        "--repeat",
+        default=DEFAULT_REPEAT,
+        type=int,
+        help="Runs per benchmark, the best one counts. default is %(default)s",
+    )
+    argparser.add_argument(
+        "--only", nargs="*", choices=list(BENCHMARKS), help="Benchmarks to run"
+    )
+    argparser.add_argument(
+        "--latency", default=0, type=float, help="Seconds the fake hub waits"
+    )
+    argparser.add_argument(
+        "--error-rate",
+        default=0,
+        type=float,
+        help="Fraction of the fake hub requests failing",
+    )
+    argparser.add_argument(
+        "--save", help="Write the results to this json file"
+    )
+    argparser.add_argument("--baseline", help="Compare with this json file")
+    argparser.add_argument(
+        "--threshold",
+        default=DEFAULT_THRESHOLD,
+        type=float,
+        help="Slowdown factor counted as a regression. default is %(default)s",
+    )
+    args = argparser.parse_args(argv)
+
+    results = run(
+        [int(_scale) for _scale in args.scales.split(",")],
+        args.repeat,
+        args.only,
+        latency=args.latency,
+        error_rate=args.error_rate,
+    )
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fl:
+            baseline = json.load(fl)
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, "w") as fl:
+            json.dump(results, fl, indent=4)
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, scale, _, _, ratio in regressions:
+            print(
+                "regression: {} at {} is {:.2f}x slower".format(
+                    name, scale, ratio
+                )
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,42 @@
+import json
 import logging
+import sys
+import time
 from argparse import ArgumentParser
 
-from aiopvapi.helpers.aiorequest import AioRequest
 from prompt_toolkit.eventloop.defaults import use_asyncio_event_loop
 
 from pv_prompt.print_output import print_dict
-from pv_prompt.base_prompts import BasePrompt, PvPrompt, QuitException, Command
-from pv_prompt.discovery import Discovery
-from pv_prompt.helpers import get_loop, set_verbosity, VERBOSE
-from pv_prompt.print_output import info, print_resource_data, print_key_values
-from pv_prompt.resource_cache import HubCache
+from pv_prompt.base_prompts import (
+    BasePrompt,
+    PvPrompt,
+    QuitException,
+    Command,
+    ListPrompt,
+)
+from pv_prompt.batch import run_batch
+from pv_prompt.helpers import (
+    DEFAULT_DISCOVERY_TIMEOUT,
+    get_loop,
+    set_verbosity,
+    set_page_size,
+    set_plain,
+    VERBOSE,
+)
+from pv_prompt.hub import HubRegistry
+from pv_prompt.print_output import (
+    info,
+    print_resource_data,
+    print_key_values,
+    print_paged,
+    hub_shade_table,
+    print_shade_updates,
+    print_request_stats,
+    warn,
+)
+from pv_prompt.resource_cache import HubCache, DEFAULT_CONCURRENCY, DEFAULT_TTL
 from pv_prompt.scenes import Scenes
+from pv_prompt.snapshot import snapshot_path
 from pv_prompt.shades import Shades
 
 # todo: get the proper hub1 netbios name.
@@ -19,6 +45,8 @@ LOGGER = logging.getLogger(__name__)
 
 
 class Rooms(PvPrompt):
+    collections = ("rooms",)
+
     def __init__(self, request, hub_cache: HubCache):
         super().__init__(request, hub_cache)
         self.api_resource = hub_cache.rooms
@@ -27,15 +55,28 @@ class Rooms(PvPrompt):
 
     async def list_rooms(self, *args, **kwargs):
         info("getting rooms")
+        await self.hub_cache.update(*self.collections)
         print_resource_data(self.hub_cache.rooms)
 
 
 class MainMenu(BasePrompt):
-    def __init__(self, loop, hub=None, verbose=False):
+    def __init__(
+        self,
+        loop,
+        hub=None,
+        verbose=False,
+        concurrency=DEFAULT_CONCURRENCY,
+        ttl=DEFAULT_TTL,
+        use_snapshot=True,
+        discovery_timeout=DEFAULT_DISCOVERY_TIMEOUT,
+        poll=False,
+    ):
         self.loop = loop
         super().__init__()
-        self.request = None
-        self.hub_cache = None
+        self.hubs = HubRegistry(
+            loop, concurrency, ttl, use_snapshot, poll=poll
+        )
+        self.discovery_timeout = discovery_timeout
         self.register_commands(
             {
                 "c": Command(function_=self._connect_to_hub),
@@ -44,17 +85,57 @@ class MainMenu(BasePrompt):
         )
         if hub:
             self._register_hub_commands()
-            self.request = AioRequest(hub, loop=self.loop)
-            self.hub_cache = HubCache(self.request, self.loop)
+            self.hubs.add(hub)
+            self._load_snapshot()
 
         self._prompt = "PowerView toolkit: "
 
+    @property
+    def request(self):
+        if self.hubs.current:
+            return self.hubs.current.request
+        return None
+
+    @property
+    def hub_cache(self):
+        if self.hubs.current:
+            return self.hubs.current.hub_cache
+        return None
+
+    def _load_snapshot(self):
+        """Fill the hub cache from its snapshot and revalidate it in the
+        background.
+
+        :return: True when a snapshot has been loaded."""
+        if not self.hub_cache.load_snapshot():
+            return False
+        info(
+            "Using hub data cached at {}. "
+            "Refreshing in the background.".format(
+                time.strftime(
+                    "%Y-%m-%d %H:%M:%S",
+                    time.localtime(self.hub_cache.snapshot_saved),
+                )
+            )
+        )
+        self.hub_cache.revalidate()
+        return True
+
     def _register_hub_commands(self):
         self.register_commands(
             {
                 "s": Command(function_=self.shades),
                 "e": Command(function_=self.scenes),
                 "r": Command(function_=self.rooms),
+                "h": Command(function_=self._switch_hub, label="switch (h)ub"),
+                "a": Command(
+                    function_=self._all_shades, label="(a)ll hubs shades"
+                ),
+                "f": Command(function_=self._shade_feed, label="shade (f)eed"),
+                "t": Command(function_=self._stats, label="s(t)ats"),
+                "x": Command(
+                    function_=self._export_stats, label="e(x)port stats"
+                ),
             }
         )
 
@@ -76,15 +157,20 @@ class MainMenu(BasePrompt):
         print_key_values("Verbosity", "on" if VERBOSE() else "off")
 
     async def _connect_to_hub(self, *args, **kwargs):
-        discovery = Discovery()
+        from pv_prompt.discovery import Discovery
+
+        discovery = Discovery(self.discovery_timeout)
         hub = await discovery.current_prompt()
         LOGGER.debug("received hub ip: {}".format(hub))
         if hub:
             info("Using {} as the PowerView hub ip address.".format(hub))
-            self.request = AioRequest(hub, loop=self.loop)
             self._register_hub_commands()
-            self.hub_cache = HubCache(self.request)
-            await self.hub_cache.update()
+            if hub in self.hubs:
+                self.hubs.switch(hub)
+            else:
+                self.hubs.add(hub)
+                if not self._load_snapshot():
+                    await self.hub_cache.refresh()
             print_dict(self.hub_cache.user_data._raw)
             # async def answer_no(*args, **kwargs):
             #     LOGGER.debug("No entered.")
@@ -107,26 +193,70 @@ class MainMenu(BasePrompt):
     #     # self._hub_cache.verbose=self.verbose
     #     await self.hub_cache.update()
 
+    async def _switch_hub(self, *args, **kwargs):
+        hubs = ListPrompt([session.address for session in self.hubs])
+        hub = await hubs.current_prompt("Select a hub: ")
+        if hub:
+            self.hubs.switch(hub)
+            info("Using {} as the PowerView hub ip address.".format(hub))
+            await self.hub_cache.update()
+
+    async def _all_shades(self, *args, **kwargs):
+        await self.hubs.update_all()
+        await print_paged(hub_shade_table(self.hubs.shades()))
+
+    async def _shade_feed(self, *args, **kwargs):
+        poller = self.hub_cache.poller
+        if poller is None:
+            warn("Shade polling is off. Start pvprompt with --poll.")
+            return
+        print_shade_updates(poller.feed)
+
+    async def _stats(self, *args, **kwargs):
+        for session in self.hubs:
+            print_request_stats(session.request.stats)
+
+    async def _export_stats(self, *args, **kwargs):
+        path = await BasePrompt().current_prompt(
+            "Export to file: ",
+            toolbar="Enter a file name.",
+            autoreturn=True,
+            default="pv_stats.json",
+        )
+        if not path:
+            return
+        try:
+            with open(path, "w") as fl:
+                json.dump(
+                    [session.request.stats.to_dict() for session in self.hubs],
+                    fl,
+                    indent=4,
+                )
+        except OSError as err:
+            warn("Unable to write request statistics: {}".format(err))
+            return
+        info("Request statistics written to {}".format(path))
+
     async def shades(self, *args, **kwargs):
         shade = Shades(self.request, self.hub_cache)
+        await self.hub_cache.update(*shade.collections)
         await shade.current_prompt()
 
     async def scenes(self, *args, **kwargs):
         scene = Scenes(self.request, self.hub_cache)
+        await self.hub_cache.update(*scene.collections)
         await scene.current_prompt()
 
     async def rooms(self, *args, **kwargs):
         rooms = Rooms(self.request, self.hub_cache)
+        await self.hub_cache.update(*rooms.collections)
         await rooms.current_prompt()
 
     def close(self):
-        if self.request:
-            self.loop.run_until_complete(self.request.websession.close())
+        self.loop.run_until_complete(self.hubs.close())
 
 
 def main():
-    use_asyncio_event_loop()
-
     argparser = ArgumentParser()
     argparser.add_argument(
         "--hubip", help="The ip address of the hub", default=None
@@ -143,14 +273,91 @@ def main():
         action="store_true",
         default=False,
     )
+    argparser.add_argument(
+        "--concurrency",
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of simultaneous hub requests. "
+        "default is {}".format(DEFAULT_CONCURRENCY),
+        type=int,
+    )
+    argparser.add_argument(
+        "--ttl",
+        default=DEFAULT_TTL,
+        help="Seconds before cached hub data is refreshed. "
+        "default is {}".format(DEFAULT_TTL),
+        type=float,
+    )
+    argparser.add_argument(
+        "--no-cache",
+        help="Do not use or store a snapshot of the hub data",
+        action="store_true",
+        default=False,
+    )
+    argparser.add_argument(
+        "--discovery-timeout",
+        default=DEFAULT_DISCOVERY_TIMEOUT,
+        help="Seconds to wait for hubs to answer a discovery. "
+        "default is {}".format(DEFAULT_DISCOVERY_TIMEOUT),
+        type=float,
+    )
+    argparser.add_argument(
+        "--poll",
+        help="Keep shade positions and battery states up to date in the "
+        "background",
+        action="store_true",
+        default=False,
+    )
+    argparser.add_argument(
+        "--plain",
+        help="Print raw hub data as json without colors",
+        action="store_true",
+        default=False,
+    )
+    argparser.add_argument(
+        "--page-size",
+        default=0,
+        help="Rows shown before a listing waits for enter. "
+        "default is 0, no paging",
+        type=int,
+    )
+    argparser.add_argument(
+        "--script",
+        help="Run the commands in this file without a prompt. Use - for stdin",
+        default=None,
+    )
     args = argparser.parse_args()
     logging.basicConfig(level=args.loglevel)
 
     set_verbosity(args.verbose)
+    set_page_size(args.page_size)
+    set_plain(args.plain)
     loop = get_loop()
+    if args.script:
+        if not args.hubip:
+            argparser.error("--script requires --hubip")
+        failed = run_batch(
+            loop,
+            args.hubip,
+            args.script,
+            args.concurrency,
+            args.ttl,
+            None if args.no_cache else snapshot_path(args.hubip),
+        )
+        sys.exit(1 if failed else 0)
+
+    use_asyncio_event_loop()
     _main = None
     try:
-        _main = MainMenu(loop, args.hubip, args.verbose)
+        _main = MainMenu(
+            loop,
+            args.hubip,
+            args.verbose,
+            args.concurrency,
+            args.ttl,
+            not args.no_cache,
+            args.discovery_timeout,
+            args.poll,
+        )
         loop.run_until_complete(_main.current_prompt())
     except QuitException:
         print("closing pv toolkit")
@@ -192,6 +192,9 @@ class ListPrompt(BasePrompt):
 
 
 class PvPrompt(BasePrompt):
+    # Hub cache collections shown by this prompt. All when empty.
+    collections = ()
+
     # def __init__(self, request: AioRequest, commands=None):
     def __init__(self, request: AioRequest, hub_cache: "HubCache", commands=None):
         super().__init__(commands=commands)
@@ -205,7 +208,7 @@ class PvPrompt(BasePrompt):
         self.api_resource = None
 
     async def refresh(self, *args, **kwargs):
-        await self.hub_cache.update()
+        await self.hub_cache.refresh(*self.collections)
 
     def _toolbar_string(self):
         line1 = super()._toolbar_string()
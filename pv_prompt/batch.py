@@ -0,0 +1,276 @@
+"""Headless command runner.
+
+Reads commands from a script or stdin, executes them against the hub and
+writes one json object per command to stdout. Example script::
+
+    # comments and empty lines are ignored.
+    shades list
+    shade 34 move 0 65535
+    shades close room 12
+    scene activate 12 13
+    scene members 12
+    stats
+"""
+
+import json
+import logging
+import shlex
+import sys
+
+from aiopvapi.helpers.aiorequest import PvApiError
+from aiopvapi.helpers.constants import (
+    ATTR_POSKIND1,
+    ATTR_POSITION1,
+    ATTR_POSKIND2,
+    ATTR_POSITION2,
+    ATTR_POSITION_DATA,
+    ATTR_ROOM_ID,
+    ATTR_TYPE,
+)
+
+from pv_prompt import bulk
+from pv_prompt.base_prompts import InvalidIdException
+from pv_prompt.resource_cache import HubCache, DEFAULT_CONCURRENCY, DEFAULT_TTL
+from pv_prompt.scheduler import ScheduledRequest
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BatchError(Exception):
+    """Incorrect batch command."""
+
+
+def shade_data(shade) -> dict:
+    return {
+        "id": shade.id,
+        "name": shade.name,
+        "type": shade.raw_data.get(ATTR_TYPE),
+        "room_id": shade.raw_data.get(ATTR_ROOM_ID),
+        "positions": shade.raw_data.get(ATTR_POSITION_DATA),
+    }
+
+
+def scene_data(scene) -> dict:
+    return {"id": scene.id, "name": scene.name, "room_id": scene.room_id}
+
+
+def room_data(room) -> dict:
+    return {"id": room.id, "name": room.name}
+
+
+def bulk_data(results) -> list:
+    return [
+        {"id": _result.id, "name": _result.name, "error": _result.error}
+        for _result in results
+    ]
+
+
+def _int(value, what):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BatchError("Incorrect {}: {}".format(what, value))
+
+
+def position_data(positions) -> dict:
+    """Convert one or two position values to hub position data."""
+    if not 1 <= len(positions) <= 2:
+        raise BatchError("Expected one or two positions.")
+    data = {ATTR_POSKIND1: 1, ATTR_POSITION1: _int(positions[0], "position")}
+    if len(positions) == 2:
+        data[ATTR_POSKIND2] = 2
+        data[ATTR_POSITION2] = _int(positions[1], "position")
+    return data
+
+
+class BatchRunner:
+    """Run text commands against a hub cache."""
+
+    def __init__(self, hub_cache: HubCache, output=None):
+        self.hub_cache = hub_cache
+        self.output = output or sys.stdout
+        self._commands = {
+            "refresh": self._refresh,
+            "userdata": self._userdata,
+            "shades": self._shades,
+            "shade": self._shade,
+            "scenes": self._scenes,
+            "scene": self._scene,
+            "rooms": self._rooms,
+            "stats": self._stats,
+        }
+
+    async def run(self, lines) -> int:
+        """Run all commands.
+
+        :return: The number of failed commands."""
+        failed = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            result = await self.run_command(line)
+            if not result["ok"]:
+                failed += 1
+            self.output.write(json.dumps(result) + "\n")
+            self.output.flush()
+        return failed
+
+    async def run_command(self, line) -> dict:
+        """Run a single command and return its outcome."""
+        try:
+            args = shlex.split(line)
+            command = self._commands.get(args[0])
+            if command is None:
+                raise BatchError("Unknown command: {}".format(args[0]))
+            result = await command(args[1:])
+        except (BatchError, InvalidIdException, ValueError, PvApiError) as err:
+            LOGGER.debug("Command %s failed: %s", line, err)
+            return {
+                "command": line,
+                "ok": False,
+                "error": str(err) or err.__class__.__name__,
+            }
+        ok = not (
+            isinstance(result, list) and any(_r.get("error") for _r in result)
+        )
+        return {"command": line, "ok": ok, "result": result}
+
+    async def _refresh(self, args):
+        for name in args:
+            if name not in self.hub_cache.collections:
+                raise BatchError("Unknown collection: {}".format(name))
+        await self.hub_cache.refresh(*args, quiet=True)
+        return {
+            name: len(getattr(self.hub_cache, name))
+            for name in args or self.hub_cache.collections
+            if name != "user_data"
+        }
+
+    async def _userdata(self, args):
+        return self.hub_cache.user_data.raw
+
+    def _select_shades(self, args):
+        """Parse selection arguments: [room <id>] [type <number>]."""
+        kwargs = {}
+        keys = {"room": "room_id", "type": "shade_type"}
+        while args:
+            if len(args) < 2 or args[0] not in keys:
+                raise BatchError("Expected room <id> or type <number>.")
+            kwargs[keys[args[0]]] = _int(args[1], args[0])
+            args = args[2:]
+        return bulk.select_shades(self.hub_cache.shades, **kwargs)
+
+    async def _shades(self, args):
+        if not args:
+            raise BatchError("Expected: shades list|open|close|stop|move")
+        action, args = args[0], args[1:]
+        if action == "list":
+            return [shade_data(_shade) for _shade in self._select_shades(args)]
+        if action == "move":
+            if not args:
+                raise BatchError("Expected: shades move <position> [...]")
+            position = bulk.primary_position(_int(args[0], "position"))
+            return bulk_data(
+                await bulk.move_shades(self._select_shades(args[1:]), position)
+            )
+        operations = {
+            "open": bulk.open_shades,
+            "close": bulk.close_shades,
+            "stop": bulk.stop_shades,
+        }
+        if action not in operations:
+            raise BatchError("Unknown shades action: {}".format(action))
+        return bulk_data(await operations[action](self._select_shades(args)))
+
+    async def _shade(self, args):
+        if len(args) < 2:
+            raise BatchError("Expected: shade <id> <action>")
+        shade = self.hub_cache.shades.find_by_id(_int(args[0], "shade id"))
+        action, args = args[1], args[2:]
+        if action == "scenes":
+            index = self.hub_cache.scene_index
+            return [
+                dict(
+                    scene_data(_scene),
+                    positions=index.position(_scene.id, shade.id),
+                )
+                for _scene in index.scenes_with_shade(shade.id)
+            ]
+        if action == "move":
+            await shade.move(position_data(args))
+        elif action in ("open", "close", "stop", "jog", "refresh"):
+            await getattr(shade, action)()
+        else:
+            raise BatchError("Unknown shade action: {}".format(action))
+        return shade_data(shade)
+
+    async def _scenes(self, args):
+        if args != ["list"]:
+            raise BatchError("Expected: scenes list")
+        return [scene_data(_scene) for _scene in self.hub_cache.scenes]
+
+    async def _scene(self, args):
+        if len(args) == 2 and args[0] == "members":
+            scene = self.hub_cache.scenes.find_by_id(_int(args[1], "scene id"))
+            positions = self.hub_cache.scene_index.positions(scene.id)
+            return [
+                {
+                    "shade_id": _shade_id,
+                    "name": self.hub_cache.shades.get_name_by_id(_shade_id),
+                    "positions": _positions,
+                }
+                for _shade_id, _positions in positions.items()
+            ]
+        if len(args) < 2 or args[0] != "activate":
+            raise BatchError(
+                "Expected: scene activate <id> [<id> ...] "
+                "or scene members <id>"
+            )
+        scenes = [
+            self.hub_cache.scenes.find_by_id(_int(_id, "scene id"))
+            for _id in args[1:]
+        ]
+        return bulk_data(await bulk.activate_scenes(scenes))
+
+    async def _rooms(self, args):
+        if args != ["list"]:
+            raise BatchError("Expected: rooms list")
+        return [room_data(_room) for _room in self.hub_cache.rooms]
+
+    async def _stats(self, args):
+        stats = getattr(self.hub_cache.request, "stats", None)
+        if stats is None:
+            raise BatchError("No request statistics available.")
+        return stats.to_dict()
+
+
+def run_batch(
+    loop,
+    hub,
+    script,
+    concurrency=DEFAULT_CONCURRENCY,
+    ttl=DEFAULT_TTL,
+    snapshot_path=None,
+) -> int:
+    """Run a command script against a hub.
+
+    :param script: Path to the script, "-" reads from stdin.
+    :return: The number of failed commands.
+    """
+
+    async def _run(lines):
+        # created in the running loop, the web session requires one.
+        request = ScheduledRequest(hub, loop=loop)
+        hub_cache = HubCache(request, loop, concurrency, ttl, snapshot_path)
+        try:
+            await hub_cache.update(quiet=True)
+            return await BatchRunner(hub_cache).run(lines)
+        finally:
+            request.stop()
+            await request.websession.close()
+
+    if script == "-":
+        return loop.run_until_complete(_run(sys.stdin))
+    with open(script) as fl:
+        return loop.run_until_complete(_run(fl))
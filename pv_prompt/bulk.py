@@ -0,0 +1,136 @@
+"""Act on many shades or scenes at once."""
+
+import asyncio
+import logging
+import time
+from collections import namedtuple
+from typing import Iterable
+
+from aiopvapi.helpers.aiorequest import PvApiError
+from aiopvapi.helpers.constants import ATTR_POSKIND1, ATTR_POSITION1, ATTR_TYPE
+
+from pv_prompt.base_prompts import InvalidIdException
+from pv_prompt.scheduler import PRIORITY_BULK, request_priority
+
+LOGGER = logging.getLogger(__name__)
+
+# Maximum number of bulk requests in flight at the same time.
+DEFAULT_BULK_CONCURRENCY = 4
+
+
+class BulkResult(
+    namedtuple("BulkResult", ["id", "name", "error", "duration"])
+):
+    """Outcome of a single item of a bulk operation."""
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def parse_ids(text) -> list:
+    """Convert a comma or space separated string of ids to integers."""
+    if not text:
+        raise InvalidIdException("No ids entered.")
+    try:
+        return [int(_id) for _id in text.replace(",", " ").split()]
+    except ValueError:
+        raise InvalidIdException("Incorrect ID in {}".format(text))
+
+
+def select_shades(shades, ids=None, room_id=None, shade_type=None) -> list:
+    """Select shades from a shade resource cache.
+
+    :param shades: The shades ResourceCache.
+    :param ids: Shade ids to select.
+    :param room_id: Select the shades in this room.
+    :param shade_type: Select the shades of this type.
+    :raises InvalidIdException when an id is not found.
+    """
+    if ids is not None:
+        selection = [shades.find_by_id(_id) for _id in ids]
+    else:
+        selection = list(shades.list_resources(room_id=room_id))
+    if shade_type is not None:
+        selection = [
+            _shade
+            for _shade in selection
+            if _shade.raw_data.get(ATTR_TYPE) == shade_type
+        ]
+    return selection
+
+
+async def run_bulk(
+    resources: Iterable,
+    action,
+    concurrency=DEFAULT_BULK_CONCURRENCY,
+    progress=None,
+) -> list:
+    """Perform an action on many resources concurrently.
+
+    The requests are sent at bulk priority, so single commands overtake
+    them and the request scheduler limits their rate.
+
+    :param resources: The aiopvapi resources to act on.
+    :param action: Coroutine function called with a single resource.
+    :param concurrency: Maximum number of actions running at once.
+    :param progress: progress.Operation following every resource.
+    :return: A BulkResult for every resource, in the order given.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(resource):
+        async with semaphore:
+            item = "{} {}".format(resource.id, resource.name)
+            if progress:
+                progress.begin(item)
+            start = time.monotonic()
+            error = None
+            try:
+                with request_priority(PRIORITY_BULK):
+                    await action(resource)
+            except PvApiError as err:
+                LOGGER.debug(
+                    "%s %s failed: %s", resource.id, resource.name, err
+                )
+                error = str(err) or err.__class__.__name__
+            if progress:
+                progress.end(item, ok=error is None)
+            return BulkResult(
+                resource.id, resource.name, error, time.monotonic() - start
+            )
+
+    return await asyncio.gather(*(_run(resource) for resource in resources))
+
+
+async def activate_scenes(scenes: Iterable, **kwargs) -> list:
+    """Activate a list of scenes."""
+    return await run_bulk(scenes, lambda scene: scene.activate(), **kwargs)
+
+
+async def open_shades(shades: Iterable, **kwargs) -> list:
+    return await run_bulk(shades, lambda shade: shade.open(), **kwargs)
+
+
+async def close_shades(shades: Iterable, **kwargs) -> list:
+    return await run_bulk(shades, lambda shade: shade.close(), **kwargs)
+
+
+async def stop_shades(shades: Iterable, **kwargs) -> list:
+    return await run_bulk(shades, lambda shade: shade.stop(), **kwargs)
+
+
+async def move_shades(shades: Iterable, position_data: dict, **kwargs) -> list:
+    """Move shades to the same position.
+
+    :param position_data: Hub position data, i.e. {"posKind1": 1,
+        "position1": 65535}
+    """
+    return await run_bulk(
+        shades, lambda shade: shade.move(dict(position_data)), **kwargs
+    )
+
+
+def primary_position(position) -> dict:
+    """Position data for the primary rail of a shade."""
+    return {ATTR_POSKIND1: 1, ATTR_POSITION1: int(position)}
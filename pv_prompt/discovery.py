@@ -1,70 +1,275 @@
+import asyncio
+import ipaddress
 import logging
+from collections import namedtuple, OrderedDict
+
+import aiohttp
+from aiopvapi.helpers.tools import base64_to_unicode
 
-import asyncdns
-from nmb.NetBIOS import NetBIOS
 from prompt_toolkit.completion import WordCompleter
 
 from pv_prompt.base_prompts import BasePrompt, Command
-from pv_prompt.print_output import print_waiting_done, info, print_table, warn
+from pv_prompt.helpers import DEFAULT_DISCOVERY_TIMEOUT
+from pv_prompt.print_output import info, print_table, warn, print_length
 
 LOGGER = logging.getLogger(__name__)
 
 NETBIOS_HUB2_NAME = "PowerView-Hub"
 NETBIOS_HUB1_NAME = "hub"
+MDNS_SERVICE = "_powerview._tcp.local."
+
+# Seconds a host gets to answer a scan probe.
+DEFAULT_SCAN_TIMEOUT = 1
+# Maximum number of hosts probed at the same time.
+DEFAULT_SCAN_CONNECTIONS = 128
+# Largest network a scan accepts, a /22.
+MAX_SCAN_ADDRESSES = 1024
+SCAN_PATH = "/api/userdata"
+
+HubInfo = namedtuple("HubInfo", ["ip", "name", "source"])
+
+
+class DiscoveryEngine:
+    """Runs all discovery methods concurrently.
+
+    `discover` yields every hub as soon as it answers. Hubs answering to
+    more than one method are reported once.
+    """
+
+    def __init__(self, timeout=DEFAULT_DISCOVERY_TIMEOUT, loop=None):
+        self.timeout = timeout
+        self.loop = loop or asyncio.get_event_loop()
+        self.hubs = OrderedDict()
+        self._queue = None
+
+    def _found(self, ip, name, source):
+        if ip in self.hubs:
+            LOGGER.debug("%s already found. Ignoring %s answer.", ip, source)
+            return
+        hub = HubInfo(ip, name, source)
+        self.hubs[ip] = hub
+        self._queue.put_nowait(hub)
+
+    async def _mdns(self):
+        import asyncdns
+
+        resolver = asyncdns.MulticastResolver()
+        query = asyncdns.Query(MDNS_SERVICE, asyncdns.ANY, asyncdns.IN)
+        try:
+            reply = await asyncio.wait_for(
+                resolver.lookup(query), self.timeout
+            )
+        finally:
+            if resolver.transport is not None:
+                resolver.close()
+        for _res in reply.answers:
+            if _res.rr_type == asyncdns.A:
+                self._found(str(_res.address), "hub2", "mdns")
+
+    def _query_netbios(self, name):
+        """Blocking NetBIOS name query. Runs in an executor."""
+        from nmb.NetBIOS import NetBIOS
+
+        nb = NetBIOS()
+        try:
+            return nb.queryName(name, timeout=self.timeout)
+        finally:
+            nb.close()
+
+    async def _netbios(self, name, hub_name):
+        ips = await self.loop.run_in_executor(None, self._query_netbios, name)
+        for ip in ips or ():
+            self._found(ip, hub_name, "netbios")
+
+    async def _run(self, name, coro):
+        try:
+            await coro
+        except asyncio.TimeoutError:
+            LOGGER.debug("%s discovery timed out.", name)
+        except Exception as err:
+            LOGGER.warning("%s discovery failed: %s", name, err)
+
+    async def discover(self):
+        """Discover hubs.
+
+        An async generator yielding each hub as it is found."""
+        self._queue = asyncio.Queue()
+        lookups = asyncio.gather(
+            self._run("mdns", self._mdns()),
+            self._run(
+                "netbios hub2", self._netbios(NETBIOS_HUB2_NAME, "hub2")
+            ),
+            self._run(
+                "netbios hub1", self._netbios(NETBIOS_HUB1_NAME, "hub1")
+            ),
+        )
+        # wakes up the loop below once all lookups are done.
+        lookups.add_done_callback(lambda fut: self._queue.put_nowait(None))
+        try:
+            while True:
+                hub = await self._queue.get()
+                if hub is None:
+                    return
+                yield hub
+        finally:
+            lookups.cancel()
+
+
+class SubnetScanner:
+    """Finds hubs by probing every address of a network for the
+    PowerView api.
+
+    For networks where multicast and broadcast traffic is filtered.
+    """
+
+    def __init__(
+        self,
+        on_found,
+        timeout=DEFAULT_SCAN_TIMEOUT,
+        connections=DEFAULT_SCAN_CONNECTIONS,
+        port=80,
+    ):
+        self.on_found = on_found
+        self.timeout = timeout
+        self.connections = connections
+        self.port = port
+
+    @staticmethod
+    def network(network):
+        """Parse a network like 192.168.2.0/24.
+
+        :raises ValueError on an incorrect network or one larger than
+            MAX_SCAN_ADDRESSES.
+        """
+        _network = ipaddress.ip_network(network, strict=False)
+        if _network.num_addresses > MAX_SCAN_ADDRESSES:
+            raise ValueError(
+                "Network {} has more than {} addresses.".format(
+                    _network, MAX_SCAN_ADDRESSES
+                )
+            )
+        return _network
+
+    @classmethod
+    def hosts(cls, network):
+        """Iterate over the host addresses of a network."""
+        _network = cls.network(network)
+        if _network.num_addresses == 1:
+            return iter([str(_network.network_address)])
+        return (str(ip) for ip in _network.hosts())
+
+    @staticmethod
+    def hub_name(user_data) -> str:
+        try:
+            return base64_to_unicode(user_data["userData"]["hubName"])
+        except (KeyError, TypeError, ValueError):
+            return "unknown"
+
+    async def _probe(self, session, ip):
+        url = "http://{}:{}{}".format(ip, self.port, SCAN_PATH)
+        try:
+            response = await asyncio.wait_for(session.get(url), self.timeout)
+            try:
+                if response.status != 200:
+                    return None
+                user_data = await asyncio.wait_for(
+                    response.json(content_type=None), self.timeout
+                )
+            finally:
+                response.release()
+        except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as err:
+            LOGGER.debug("%s did not answer: %s", ip, err)
+            return None
+        hub = HubInfo(ip, self.hub_name(user_data), "scan")
+        self.on_found(hub)
+        return hub
+
+    async def _worker(self, session, hosts, hubs):
+        # all workers share the hosts iterator, so every address is
+        # probed once.
+        for ip in hosts:
+            hub = await self._probe(session, ip)
+            if hub:
+                hubs.append(hub)
+
+    async def scan(self, network) -> list:
+        """Probe all hosts of a network.
+
+        :return: All hubs found.
+        :raises ValueError on an incorrect network.
+        """
+        hosts = self.hosts(network)
+        hubs = []
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await asyncio.gather(
+                *(
+                    self._worker(session, hosts, hubs)
+                    for _ in range(self.connections)
+                )
+            )
+        return sorted(hubs, key=lambda hub: ipaddress.ip_address(hub.ip))
 
 
 class Discovery(BasePrompt):
-    def __init__(self):
+    def __init__(self, timeout=DEFAULT_DISCOVERY_TIMEOUT):
         super().__init__()
         self._prompt = "Hub connection: "
         self.register_commands(
             {
                 "d": Command(function_=self._discover),
+                "s": Command(function_=self._scan, label="(s)can network"),
                 "c": Command(function_=self.connect, autoreturn=True),
             }
         )
-        self._ip_suggestions = None
+        self.timeout = timeout
+        self._ip_suggestions = []
         self._ip_completer = None
 
+    def _hub_found(self, hub: HubInfo):
+        if hub.ip in self._ip_suggestions:
+            return
+        print_table(hub.name, hub.ip, hub.source)
+        self._ip_suggestions.append(hub.ip)
+        self._populate_completer()
+
     async def _discover(self, *args, **kwargs):
         self._ip_suggestions = []
+        info("Discovering hubs for {} seconds...".format(self.timeout))
+        self.print_hub_table()
+        engine = DiscoveryEngine(self.timeout)
+        async for hub in engine.discover():
+            self._hub_found(hub)
+        if engine.hubs:
+            print_length(len(engine.hubs))
+        else:
+            warn("...Discovery timed out")
 
-        resolver = asyncdns.MulticastResolver()
-
-        query = asyncdns.Query(
-            "_powerview._tcp.local.", asyncdns.ANY, asyncdns.IN
+    async def _scan(self, *args, **kwargs):
+        pr = BasePrompt()
+        network = await pr.current_prompt(
+            "Enter network: ",
+            toolbar="Enter a network to scan: 192.168.2.0/24",
+            autoreturn=True,
         )
-        done = print_waiting_done("Discovering hubs")
-
-        r = await resolver.lookup(query)
-        # r = f.result()
-
-        await done()
-
-        for _res in r.answers:
-            if _res.rr_type == asyncdns.A:
-                add = str(_res.address)
-                info(add)
-                self._ip_suggestions.append(add)
-        self._populate_completer()
-
-    async def _discover_hub1(self, *args, **kwargs):
-        nb = NetBIOS()
-        info("Discovering hubs...")
-        LOGGER.debug("discover command fire")
-        self._ip_suggestions = nb.queryName(NETBIOS_HUB1_NAME, timeout=5)
-        if self._ip_suggestions:
-            self.print_hub_table()
-            for _hub in self._ip_suggestions:
-                print_table("hub1", _hub)
-            self._populate_completer()
+        scanner = SubnetScanner(self._hub_found)
+        try:
+            _network = scanner.network(network)
+        except ValueError as err:
+            warn("Invalid network entered. {}".format(err))
+            return
+        info("Scanning {} addresses...".format(_network.num_addresses))
+        self.print_hub_table()
+        hubs = await scanner.scan(network)
+        if hubs:
+            print_length(len(hubs))
         else:
-            warn("...Discovery timed out")
+            warn("...No hubs found")
 
     def print_hub_table(self):
         print("")
-        print_table("NAME", "IP ADDRESS")
-        print_table("----", "----------")
+        print_table("NAME", "IP ADDRESS", "FOUND BY")
+        print_table("----", "----------", "--------")
 
     def _populate_completer(self):
         self._ip_completer = WordCompleter(self._ip_suggestions)
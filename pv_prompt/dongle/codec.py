@@ -0,0 +1,266 @@
+"""Codec for the dongle byte protocol.
+
+Every message is sent as a frame: a two byte big endian payload length
+followed by the payload. The payload starts with a code identifying the
+message, followed by its arguments::
+
+    >>> Move(Move.UP, group=0).encode()
+    b'\\x00\\x03RU\\x00'
+    >>> decode(b"\\x00\\x03SG\\x05")
+    ActivateScene(5)
+
+`FrameDecoder` cuts a received byte stream into frames. Partial frames
+are kept until the rest arrives; all frames completed by a read are
+parsed from a memoryview over one buffer, which is compacted once per
+read.
+"""
+
+LENGTH_SIZE = 2
+MAX_PAYLOAD = 0xFFFF
+
+
+class CodecError(ValueError):
+    pass
+
+
+def encode_frame(payload) -> bytes:
+    if len(payload) > MAX_PAYLOAD:
+        raise CodecError("Payload too long: {} bytes".format(len(payload)))
+    return len(payload).to_bytes(LENGTH_SIZE, "big") + bytes(payload)
+
+
+class Message:
+    """A protocol message: its code followed by the arguments in `data`."""
+
+    code = b""
+
+    def __init__(self, data=b""):
+        self.data = bytes(data)
+
+    @classmethod
+    def from_data(cls, data):
+        """Create from the payload bytes following the code."""
+        return cls(data)
+
+    @property
+    def payload(self) -> bytes:
+        return self.code + self.data
+
+    def encode(self) -> bytes:
+        return encode_frame(self.payload)
+
+    def _args(self) -> tuple:
+        return (self.data,) if self.data else ()
+
+    def __eq__(self, other):
+        return isinstance(other, Message) and self.payload == other.payload
+
+    def __hash__(self):
+        return hash(self.payload)
+
+    def __repr__(self):
+        return "{}({})".format(
+            type(self).__name__, ", ".join(repr(_arg) for _arg in self._args())
+        )
+
+
+class Unknown(Message):
+    """A payload without a known code."""
+
+    @property
+    def payload(self) -> bytes:
+        return self.data
+
+
+class _ByteArgument(Message):
+    """A message with a single byte argument."""
+
+    def __init__(self, value):
+        self.value = value
+        super().__init__(bytes((value,)))
+
+    @classmethod
+    def from_data(cls, data):
+        if not len(data) == 1:
+            return Unknown(cls.code + bytes(data))
+        return cls(data[0])
+
+    def _args(self) -> tuple:
+        return (self.value,)
+
+
+class Move(Message):
+    """Move a group of shades."""
+
+    code = b"R"
+
+    UP = b"U"
+    DOWN = b"D"
+    TILT_OPEN = b"R"
+    TILT_CLOSE = b"L"
+    STOP = b"S"
+
+    def __init__(self, direction, group=0):
+        self.direction = direction
+        self.group = group
+        super().__init__(direction + bytes((group,)))
+
+    @classmethod
+    def from_data(cls, data):
+        if not len(data) == 2:
+            return Unknown(cls.code + bytes(data))
+        return cls(bytes(data[:1]), data[1])
+
+    def _args(self) -> tuple:
+        return self.direction, self.group
+
+
+class ActivateScene(_ByteArgument):
+    code = b"SG"
+
+
+class Jog(_ByteArgument):
+    code = b"cj"
+
+
+class NetworkAdd(Message):
+    code = b"N"
+
+
+class GroupAdd(Message):
+    code = b"A"
+
+
+class ToHubId(Message):
+    code = b"z"
+
+
+class Program(_ByteArgument):
+    """A step of programming the limits and slats of a shade."""
+
+    code = b"#LP"
+
+
+class ProgramSlat(_ByteArgument):
+    code = b"#LT"
+
+
+class MotorType(_ByteArgument):
+    code = b"#DS"
+
+
+class Orientation(_ByteArgument):
+    code = b"#d"
+
+
+class Reverse(Message):
+    code = b"#x"
+
+
+class Reset(Message):
+    code = b"#@r"
+
+
+class NetworkReset(Message):
+    code = b"@r?"
+
+
+# Longest codes first, so b"#LP" is tried before a shorter code it
+# starts with.
+MESSAGE_TYPES = sorted(
+    (
+        Move,
+        ActivateScene,
+        Jog,
+        NetworkAdd,
+        GroupAdd,
+        ToHubId,
+        Program,
+        ProgramSlat,
+        MotorType,
+        Orientation,
+        Reverse,
+        Reset,
+        NetworkReset,
+    ),
+    key=lambda _type: -len(_type.code),
+)
+
+
+def decode_payload(payload) -> Message:
+    """Parse a payload. Accepts bytes, bytearray or memoryview."""
+    for _type in MESSAGE_TYPES:
+        size = len(_type.code)
+        if payload[:size] == _type.code:
+            return _type.from_data(payload[size:])
+    return Unknown(payload)
+
+
+def decode(frame) -> Message:
+    """Parse a single complete frame."""
+    messages = FrameDecoder().feed_messages(frame)
+    if not len(messages) == 1:
+        raise CodecError("Not a single frame: {}".format(bytes(frame)))
+    return messages[0]
+
+
+class FrameDecoder:
+    """Incremental decoder for a stream of frames."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    @property
+    def pending(self) -> int:
+        """Number of bytes of a partial frame."""
+        return len(self._buffer)
+
+    def _feed(self, data, parse) -> list:
+        self._buffer.extend(data)
+        items = []
+        pos = 0
+        size = len(self._buffer)
+        with memoryview(self._buffer) as view:
+            while size - pos >= LENGTH_SIZE:
+                length = int.from_bytes(view[pos : pos + LENGTH_SIZE], "big")
+                end = pos + LENGTH_SIZE + length
+                if end > size:
+                    break
+                items.append(parse(view, pos, end))
+                pos = end
+        if pos:
+            del self._buffer[:pos]
+        return items
+
+    def feed(self, data) -> list:
+        """Add received bytes.
+
+        :return: The frames completed by these bytes, length included."""
+        return self._feed(
+            data, lambda view, start, end: bytes(view[start:end])
+        )
+
+    def feed_messages(self, data) -> list:
+        """Add received bytes.
+
+        :return: The messages completed by these bytes."""
+        return self._feed(
+            data,
+            lambda view, start, end: decode_payload(
+                view[start + LENGTH_SIZE : end]
+            ),
+        )
+
+    def clear(self):
+        self._buffer.clear()
+
+
+def split_frames(data) -> list:
+    """Split bytes holding one or more complete frames.
+
+    :raises CodecError when the data ends with a partial frame."""
+    decoder = FrameDecoder()
+    frames = decoder.feed(data)
+    if decoder.pending:
+        raise CodecError("Incomplete frame: {}".format(bytes(data)))
+    return frames
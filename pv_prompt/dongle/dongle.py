@@ -2,14 +2,16 @@
 
 import asyncio
 import logging
+from collections import deque
 from enum import Enum
+from functools import lru_cache
 
 from prompt_toolkit.completion import WordCompleter
-from serial import Serial
-from serial.serialutil import SerialException
-from serial.tools.list_ports import comports
 
 from pv_prompt.base_prompts import BasePrompt, Command
+from pv_prompt.dongle.codec import CodecError, Message, split_frames
+from pv_prompt.dongle.nordic import Nd
+from pv_prompt.dongle.transport import SerialTransport
 from pv_prompt.print_output import info
 
 LOGGER = logging.getLogger(__name__)
@@ -17,6 +19,8 @@ LOGGER = logging.getLogger(__name__)
 MESSAGE_CONNECTION_STATE = "connection_state"
 MESSAGE_OUTGOING = "out"
 MESSAGE_INCOMING = "in"
+# Event loop time of an outgoing or incoming frame.
+MESSAGE_TIME = "time"
 
 
 class NordicConnectionProblem(Exception):
@@ -31,18 +35,61 @@ class NordicReadProblem(NordicConnectionProblem):
     pass
 
 
+# The representation of every byte value: printable ascii as is, the
+# rest as hex.
+_BYTE_REPS = tuple(
+    chr(_bt) if 32 <= _bt < 127 else hex(_bt) for _bt in range(256)
+)
+_PRINTABLE = bytes(range(32, 127))
+_HEX = tuple("{:02x}".format(_bt) for _bt in range(256))
+# Printable ascii as is, the rest as a dot.
+_DUMP_TABLE = bytes(_bt if 32 <= _bt < 127 else ord(".") for _bt in range(256))
+
+
+# Dongle traffic repeats itself, most frames are formatted before.
+@lru_cache(maxsize=1024)
+def _byte_to_string_rep(data: bytes) -> str:
+    if not data.translate(None, _PRINTABLE):
+        return data.decode("ascii")
+    return "".join([_BYTE_REPS[_bt] for _bt in data])
+
+
+# The commands are formatted once.
+_COMMAND_REPS = {_nd.value: _byte_to_string_rep(_nd.value) for _nd in Nd}
+
+
 def byte_to_string_rep(byte_instance):
-    string_rep = []
-    for bt in byte_instance:
-        if 32 <= bt < 127:
-            string_rep.append(chr(bt))
-        else:
-            string_rep.append(hex(bt))
-    _string_rep = "".join(string_rep)
-    return _string_rep
+    data = bytes(byte_instance)
+    return _COMMAND_REPS.get(data) or _byte_to_string_rep(data)
 
 
-from enum import Enum
+class FrameRep:
+    """Formats a frame only when logged."""
+
+    __slots__ = ("frame",)
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __str__(self):
+        return byte_to_string_rep(self.frame)
+
+
+def hexdump(byte_instance, width=16) -> list:
+    """Offset, hex and ascii columns of data, `width` bytes per line."""
+    data = bytes(byte_instance)
+    lines = []
+    for offset in range(0, len(data), width):
+        chunk = data[offset : offset + width]
+        lines.append(
+            "{:04x}  {:<{}}  {}".format(
+                offset,
+                " ".join([_HEX[_bt] for _bt in chunk]),
+                width * 3 - 1,
+                chunk.translate(_DUMP_TABLE).decode("ascii"),
+            )
+        )
+    return lines
 
 
 class State(Enum):
@@ -51,59 +98,166 @@ class State(Enum):
     writing = 2
 
 
-class NordicSerial:
-    _read_delay = 0.1
+# Seconds between two frames written to the dongle.
+DEFAULT_FRAME_SPACING = 0.05
+# Frames written before their response has arrived. Responses are
+# matched to frames in order, more than one pipelines the commands.
+DEFAULT_MAX_IN_FLIGHT = 1
+
+
+def to_frames(data) -> bytes:
+    """The bytes of frames, an `Nd` member or a `codec.Message`."""
+    if isinstance(data, Message):
+        return data.encode()
+    return getattr(data, "value", data)
+
+
+class DongleCommand:
+    """A queued command: one or more frames and the expected response.
+
+    A command without `expect_response` is done once its frames are
+    written. Responses to it are still matched, so they are not taken for
+    the response to a later command, but a missing one is no problem.
+    """
+
+    def __init__(self, loop, data, response=None, expect_response=True):
+        self.data = to_frames(data)
+        self.response = to_frames(response) if response else None
+        self.expect_response = expect_response
+        try:
+            self.frames = split_frames(self.data)
+        except CodecError:
+            # not a framed command, send as is and expect a single response.
+            self.frames = [self.data]
+        self.responses = []
+        self.future = loop.create_future()
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    def fail(self, err):
+        if not self.done:
+            self.future.set_exception(err)
+
+    def response_received(self, frame):
+        """Add the response to one of the frames."""
+        self.responses.append(frame)
+        if len(self.responses) < len(self.frames) or self.done:
+            return
+        _val = b"".join(self.responses)
+        if self.response and not _val == self.response:
+            LOGGER.error("Dongle response not correct")
+            self.fail(NordicReadProblem())
+        else:
+            self.future.set_result(_val)
+
 
-    def __init__(self, loop, serial_port, serial_speed=38400):
+class NordicSerial:
+    """Connection to the nordic dongle.
+
+    Commands are queued and written by a single writer task, spaced by
+    `frame_spacing` seconds. Responses are matched to the frames written,
+    in order.
+    """
+
+    # Seconds to wait for the response to a frame.
+    response_timeout = 1
+
+    def __init__(
+        self,
+        loop,
+        serial_port,
+        serial_speed=38400,
+        frame_spacing=DEFAULT_FRAME_SPACING,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        transport_factory=SerialTransport,
+    ):
+        """
+        :param transport_factory: Called with the loop, port and speed to
+            create the transport. Replay passes a simulated dongle.
+        """
         self._network_id = None
         # self.id_change = b"\x00\x03i"
         # self.id_change_response = b"\x03i"
-        self.serial = None
+        self.transport = None
         self.port = serial_port
         self.serial_speed = serial_speed
+        self.transport_factory = transport_factory
+        self.frame_spacing = frame_spacing
         self.loop = loop
-        self.loop.create_task(self.connector())
-        self._read_try_count = 10
         self.tries = 0
         self.message_queue = asyncio.Queue()
         self.state = State.idle
+        self._commands = asyncio.Queue()
+        # (command, timeout handle) of every frame awaiting its response.
+        self._pending = deque()
+        self._window = asyncio.Semaphore(max_in_flight)
+        self._reader_task = None
+        self._sending = False
+        self.connector_task = self.loop.create_task(self.connector())
+        self.writer_task = self.loop.create_task(self._writer())
+
+    @property
+    def network_id(self):
+        return self._network_id
+
+    @property
+    def connected(self):
+        return self.transport is not None and self.transport.is_open
+
+    @property
+    def busy(self):
+        return (
+            self._sending or bool(self._pending) or not self._commands.empty()
+        )
 
     def disconnect(self):
         LOGGER.debug("Disconnecting from serial")
-        if self.serial is not None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self.transport is not None:
             try:
-                self.serial.close()
+                self.transport.close()
             except Exception as err:
                 LOGGER.error(err)
-        self.serial = None
+        self.transport = None
+        self._fail_pending(NordicReadProblem())
         self._set_connection_state(State.disconnected)
 
+    def close(self):
+        """Stop the connector and writer tasks and disconnect."""
+        self.connector_task.cancel()
+        self.writer_task.cancel()
+        self.disconnect()
+        while not self._commands.empty():
+            self._commands.get_nowait().fail(NordicWriteProblem())
+
     def _set_connection_state(self, state: State):
         self.state = state
         self.message_queue.put_nowait(
             {MESSAGE_CONNECTION_STATE: self.state.name}
         )
 
-    @asyncio.coroutine
-    def connector(self):
+    async def connector(self):
         """Check connection state in a loop"""
         while True:
             if self.state == State.idle:
                 LOGGER.debug("Checking connection")
-                if self.serial is not None:
-                    LOGGER.debug(self.serial.closed)
-                if self.serial is None or self.serial.closed:
+                if not self.connected:
                     LOGGER.info("Trying to connect")
-                    yield from self.connect()
+                    await self.connect()
 
-            yield from asyncio.sleep(5)
+            await asyncio.sleep(5)
 
-    @asyncio.coroutine
-    def connect(self):
+    async def connect(self):
         """Connects to the serial port and prepares the nordic
         for sending commands to the blinds."""
+        if self.connected:
+            return
 
-        yield from self.message_queue.put(
+        await self.message_queue.put(
             {MESSAGE_CONNECTION_STATE: self.state.name}
         )
 
@@ -112,78 +266,185 @@ class NordicSerial:
             self.serial_speed,
             self.tries,
         )
+        from serial.serialutil import SerialException
+
+        transport = self.transport_factory(
+            self.loop, self.port, self.serial_speed
+        )
         try:
-            self.serial = Serial(
-                self.port, baudrate=self.serial_speed, timeout=0
-            )
+            transport.open()
         except SerialException:
-            yield from self.message_queue.put(
+            await self.message_queue.put(
                 {MESSAGE_CONNECTION_STATE: self.state.name}
             )
 
             LOGGER.error("Problem connecting")
             return
+        self.transport = transport
+        self._reader_task = self.loop.create_task(self._reader(transport))
 
-        # yield from asyncio.sleep(1)
+        # await asyncio.sleep(1)
         # LOGGER.info("Changing dongle id.")
-        # self.serial.write(self.id_change)
-
-        LOGGER.info("Connected to serial port %s", self.serial.port)
+        # self.transport.write(self.id_change)
+
+        self._set_connection_state(State.writing if self.busy else State.idle)
+
+    def submit(
+        self, data, response=None, expect_response=True
+    ) -> asyncio.Future:
+        """Queue a command.
+
+        :param data: One or more frames, an `Nd` member or a
+            `codec.Message`.
+        :param response: The expected response, as bytes or message.
+            When it differs the future fails with `NordicReadProblem`.
+        :param expect_response: False for fire-and-forget commands, like a
+            jog or a move. Their future is done with None once written and
+            a missing response does not disconnect.
+        :return: Future of the response, failing with a
+            `NordicConnectionProblem`.
+        """
+        command = DongleCommand(self.loop, data, response, expect_response)
+        self._commands.put_nowait(command)
+        if not self.state == State.disconnected:
+            self._set_connection_state(State.writing)
+        return command.future
+
+    def submit_batch(self, commands) -> list:
+        """Queue commands to be written back to back.
+
+        :param commands: Anything `submit` accepts as data, or (data,
+            response) tuples.
+        :return: A future per command.
+        """
+        return [
+            (
+                self.submit(*_command)
+                if isinstance(_command, tuple)
+                else self.submit(_command)
+            )
+            for _command in commands
+        ]
 
-        self._set_connection_state(State.idle)
+    async def _writer(self):
+        while True:
+            command = await self._commands.get()
+            if command.done:
+                continue
+            self._sending = True
+            try:
+                await self._send(command)
+            except NordicConnectionProblem as err:
+                command.fail(err)
+                self.disconnect()
+            finally:
+                self._sending = False
+            self._update_state()
+
+    async def _send(self, command):
+        for frame in command.frames:
+            await self._window.acquire()
+            if command.done:
+                # an earlier frame has failed.
+                self._window.release()
+                return
+            if not self.connected:
+                # a missing response disconnects while waiting for the
+                # window.
+                await self.connect()
+            if not self.connected:
+                self._window.release()
+                raise NordicWriteProblem()
+            try:
+                LOGGER.debug("outgoing: %s", FrameRep(frame))
+                self.transport.write(frame)
+            except Exception as err:
+                LOGGER.error("Problem writing to serial. %s", err)
+                self._window.release()
+                raise NordicWriteProblem()
+            handle = self.loop.call_later(
+                self.response_timeout, self._response_timeout, command
+            )
+            self._pending.append((command, handle))
+            await self.message_queue.put(
+                {MESSAGE_OUTGOING: frame, MESSAGE_TIME: self.loop.time()}
+            )
+            await asyncio.sleep(self.frame_spacing)
+        if not command.expect_response and not command.done:
+            command.future.set_result(None)
 
-    @asyncio.coroutine
-    def _write(self, data, response=None):
-        _val = None
-        try:
-            LOGGER.debug("outgoing: %s", data)
-            self.serial.write(data)
-        except (SerialException, AttributeError) as err:
-            LOGGER.error("Problem writing to serial. %s", err)
-
-            raise NordicWriteProblem()
-        yield from self.message_queue.put({MESSAGE_OUTGOING: data})
-
-        for i in range(self._read_try_count):
-            _val = self.serial.read()
-            if _val:
-                yield from asyncio.sleep(self._read_delay)
-                _val += self.serial.read(self.serial.in_waiting)
+    async def _reader(self, transport):
+        while True:
+            frame = await transport.frames.get()
+            LOGGER.debug("incoming: %s", FrameRep(frame))
+            await self.message_queue.put(
+                {MESSAGE_INCOMING: frame, MESSAGE_TIME: self.loop.time()}
+            )
+            if not self._pending:
+                LOGGER.debug("Unsolicited frame: %s", FrameRep(frame))
+                continue
+            command, handle = self._pending.popleft()
+            handle.cancel()
+            self._window.release()
+            command.response_received(frame)
+            self._update_state()
+
+    def _response_timeout(self, command):
+        if not command.expect_response:
+            LOGGER.debug("No response to: %s", FrameRep(command.data))
+            self._forget(command)
+            return
+        LOGGER.error("Problem reading from serial")
+        self.disconnect()
+
+    def _forget(self, command):
+        """Stop waiting for the response to a frame of a command."""
+        for _entry in self._pending:
+            if _entry[0] is command:
+                self._pending.remove(_entry)
+                self._window.release()
                 break
-            yield from asyncio.sleep(self._read_delay)
-        if response:
-            if not _val == response:
-                LOGGER.error("Dongle response not correct")
-                raise NordicReadProblem()
-        if _val is None:
-            LOGGER.error("Problem reading from serial")
-            raise NordicReadProblem()
-
-        yield from self.message_queue.put({MESSAGE_INCOMING: _val})
-
-    @asyncio.coroutine
-    def write(self, data):
-        self._set_connection_state(State.writing)
-        try:
-            yield from self._write(data)
+        self._update_state()
 
-        except NordicConnectionProblem:
-            self.disconnect()
+    def _fail_pending(self, err):
+        """Fail all frames awaiting a response.
+
+        Responses are matched in order, after a missing one the rest can
+        not be trusted."""
+        while self._pending:
+            command, handle = self._pending.popleft()
+            handle.cancel()
+            self._window.release()
+            command.fail(err)
+
+    def _update_state(self):
+        if self.state == State.writing and not self.busy:
+            self._set_connection_state(State.idle)
+
+    async def write(self, data, expect_response=True):
+        """Write a command, retrying once after reconnecting.
 
+        A fire-and-forget command, without `expect_response`, is only
+        retried when writing it failed, so it never runs twice.
+
+        :return: The response, None when the command could not be sent or
+            no response is expected.
+        """
+        try:
+            response = await self.submit(data, expect_response=expect_response)
+        except NordicConnectionProblem:
             self.tries += 1
             LOGGER.info("Write retry %s", self.tries)
             if self.tries < 2:
-                yield from asyncio.sleep((self.tries - 1) * 1)
-                yield from self.connect()
-                yield from self.write(data)
-            else:
-                LOGGER.debug("unable to send command.")
-                self.tries = 0
-                self._set_connection_state(State.idle)
-        else:
+                await asyncio.sleep((self.tries - 1) * 1)
+                return await self.write(data, expect_response)
+            LOGGER.debug("unable to send command.")
+            self.tries = 0
             self._set_connection_state(State.idle)
+        else:
             LOGGER.debug("changing state to %s", self.state)
             self.tries = 0
+            return response
 
 
 class Connect(BasePrompt):
@@ -206,6 +467,8 @@ class Connect(BasePrompt):
         self.port = None
 
     async def search_port(self, *args, **kwargs):
+        from serial.tools.list_ports import comports
+
         for i in comports():
             for _dongle in self.dongles:
                 if (
@@ -0,0 +1,374 @@
+"""Record the serial traffic of the dongle and replay it.
+
+A log file starts with a header holding the wall clock time the
+recording started. Every frame follows as a record: its offset in
+seconds from the start, its direction and its length, then the frame
+itself.
+
+Replay feeds the recorded outgoing frames through a `NordicSerial`
+connected to a `SimulatedTransport`, which answers every frame with the
+responses recorded after it. Usage::
+
+    pv_dongle --record session.log
+    python -m pv_prompt.dongle.recorder session.log --speed 10
+    python -m pv_prompt.dongle.recorder session.log --dump
+"""
+
+import asyncio
+import logging
+import struct
+import sys
+import time
+from argparse import ArgumentParser
+from collections import namedtuple
+
+from pv_prompt.dongle.codec import CodecError, split_frames
+from pv_prompt.dongle.dongle import (
+    MESSAGE_INCOMING,
+    MESSAGE_OUTGOING,
+    MESSAGE_TIME,
+    NordicConnectionProblem,
+    NordicSerial,
+    byte_to_string_rep,
+    hexdump,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"PVDL"
+VERSION = 1
+# magic, version, wall clock start time.
+HEADER = struct.Struct("<4sBd")
+# offset in seconds, direction, frame length.
+RECORD = struct.Struct("<dBH")
+
+OUTGOING = 0
+INCOMING = 1
+
+Record = namedtuple("Record", "time direction frame")
+
+
+class LogError(ValueError):
+    pass
+
+
+class Recorder:
+    """Writes the frames of a `NordicSerial` message queue to a log file."""
+
+    def __init__(self, path, loop):
+        self.path = path
+        self.loop = loop
+        self.records = 0
+        self._file = None
+        self._start = None
+        self._queue = None
+        self._task = None
+
+    def open(self):
+        self._file = open(self.path, "wb")
+        self._start = self.loop.time()
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+
+    def record(self, message_queue):
+        """Record the frames put on a message queue.
+
+        Replaces the queue recorded so far."""
+        if self._file is None:
+            self.open()
+        self._stop_task()
+        self._queue = message_queue
+        self._task = asyncio.ensure_future(self._run(message_queue))
+
+    async def _run(self, message_queue):
+        while True:
+            self.write(await message_queue.get())
+
+    def write(self, message):
+        if MESSAGE_OUTGOING in message:
+            direction, frame = OUTGOING, message[MESSAGE_OUTGOING]
+        elif MESSAGE_INCOMING in message:
+            direction, frame = INCOMING, message[MESSAGE_INCOMING]
+        else:
+            return
+        offset = message.get(MESSAGE_TIME, self.loop.time()) - self._start
+        self._file.write(RECORD.pack(offset, direction, len(frame)))
+        self._file.write(frame)
+        self.records += 1
+
+    def _stop_task(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # the frames queued before stopping are recorded too.
+        while self._queue is not None and not self._queue.empty():
+            self.write(self._queue.get_nowait())
+
+    def close(self):
+        self._stop_task()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_log(path) -> tuple:
+    """Read a log file.
+
+    :return: The wall clock start time and a list of records.
+    :raises LogError when the file is not a log or is cut short."""
+    with open(path, "rb") as fl:
+        data = fl.read()
+    if len(data) < HEADER.size:
+        raise LogError("Not a dongle log: {}".format(path))
+    magic, version, started = HEADER.unpack_from(data)
+    if not magic == MAGIC or not version == VERSION:
+        raise LogError("Not a dongle log: {}".format(path))
+    records = []
+    view = memoryview(data)
+    pos = HEADER.size
+    while pos < len(data):
+        if pos + RECORD.size > len(data):
+            raise LogError("Log ends in a record header: {}".format(path))
+        offset, direction, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        if pos + length > len(data):
+            raise LogError("Log ends in a frame: {}".format(path))
+        records.append(
+            Record(offset, direction, bytes(view[pos : pos + length]))
+        )
+        pos += length
+    return started, records
+
+
+Exchange = namedtuple("Exchange", "time frame responses")
+
+
+def exchanges(records) -> tuple:
+    """Group records by outgoing frame.
+
+    :return: The incoming records before the first outgoing frame, and
+        an `Exchange` per outgoing frame holding the (delay, frame) of the
+        responses recorded until the next one.
+    """
+    unsolicited = []
+    _exchanges = []
+    for record in records:
+        if record.direction == OUTGOING:
+            _exchanges.append(Exchange(record.time, record.frame, []))
+        elif _exchanges:
+            _exchanges[-1].responses.append(
+                (record.time - _exchanges[-1].time, record.frame)
+            )
+        else:
+            unsolicited.append((record.time, record.frame))
+    return unsolicited, _exchanges
+
+
+class SimulatedTransport:
+    """A dongle answering as recorded, in place of a `SerialTransport`.
+
+    :param speed: Replay speed. 2 halves all delays, None answers
+        immediately.
+    """
+
+    def __init__(self, loop, records, speed=1.0):
+        self.loop = loop
+        self.speed = speed
+        self.unsolicited, self.exchanges = exchanges(records)
+        self.frames = asyncio.Queue()
+        self.written = []
+        # (exchange index, recorded frame, written frame)
+        self.mismatches = []
+        self._cursor = 0
+        self._handles = []
+        self._open = False
+
+    def __call__(self, loop, port, baudrate):
+        """Act as transport factory of a `NordicSerial`."""
+        return self
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def _delay(self, seconds):
+        return seconds / self.speed if self.speed else 0
+
+    def _deliver(self, delay, frame):
+        if not self.speed:
+            self.frames.put_nowait(frame)
+            return
+        self._handles.append(
+            self.loop.call_later(
+                self._delay(delay), self.frames.put_nowait, frame
+            )
+        )
+
+    def open(self):
+        self._open = True
+        for delay, frame in self.unsolicited:
+            self._deliver(delay, frame)
+        self.unsolicited = []
+
+    def close(self):
+        self._open = False
+        for handle in self._handles:
+            handle.cancel()
+        self._handles = []
+
+    def write(self, data):
+        if not self._open:
+            raise AttributeError("Simulated dongle is closed")
+        try:
+            frames = split_frames(data)
+        except CodecError:
+            frames = [data]
+        for frame in frames:
+            self.written.append(frame)
+            if self._cursor >= len(self.exchanges):
+                self.mismatches.append((self._cursor, None, frame))
+                continue
+            exchange = self.exchanges[self._cursor]
+            if not exchange.frame == frame:
+                self.mismatches.append((self._cursor, exchange.frame, frame))
+            for delay, response in exchange.responses:
+                self._deliver(delay, response)
+            self._cursor += 1
+
+    def discard(self):
+        while not self.frames.empty():
+            self.frames.get_nowait()
+
+    async def read_frame(self, timeout) -> bytes:
+        return await asyncio.wait_for(self.frames.get(), timeout)
+
+
+ReplayResult = namedtuple("ReplayResult", "frames mismatches errors duration")
+
+
+async def replay(loop, records, speed=1.0, **kwargs) -> ReplayResult:
+    """Send the recorded outgoing frames through a simulated dongle.
+
+    Frames are sent at their recorded offsets from the start of the
+    recording divided by `speed`, or back to back when `speed` is None.
+
+    :param kwargs: Passed to `NordicSerial`.
+    :return: The number of frames sent, the (exchange index, recorded
+        response, replayed response) of every response differing from
+        the recording, the number of failed commands and the duration.
+    """
+    transport = SimulatedTransport(loop, records, speed)
+    kwargs.setdefault("frame_spacing", 0)
+    nordic = NordicSerial(
+        loop, "replay", transport_factory=transport, **kwargs
+    )
+    start = loop.time()
+    await nordic.connect()
+    while not transport.frames.empty():
+        # let the frames received before the first command be read first.
+        await asyncio.sleep(0)
+    futures = []
+    for exchange in transport.exchanges:
+        if speed:
+            await asyncio.sleep(start + exchange.time / speed - loop.time())
+        # frames without a recorded reply were sent fire-and-forget.
+        futures.append(
+            nordic.submit(
+                exchange.frame, expect_response=bool(exchange.responses)
+            )
+        )
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    duration = loop.time() - start
+    nordic.close()
+
+    mismatches = []
+    errors = 0
+    for idx, (exchange, result) in enumerate(
+        zip(transport.exchanges, results)
+    ):
+        if isinstance(result, NordicConnectionProblem):
+            errors += 1
+            continue
+        # later responses were not asked for, NordicSerial skips them.
+        expected = exchange.responses[0][1] if exchange.responses else None
+        if not result == expected:
+            mismatches.append((idx, expected, result))
+    return ReplayResult(len(futures), mismatches, errors, duration)
+
+
+def print_dump(started, records):
+    """Print every record with a hexdump of its frame."""
+    print(
+        "recorded {}".format(
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started))
+        )
+    )
+    for record in records:
+        print(
+            "{:10.3f} {} {} bytes".format(
+                record.time,
+                "out" if record.direction == OUTGOING else "in ",
+                len(record.frame),
+            )
+        )
+        for line in hexdump(record.frame):
+            print("    " + line)
+
+
+def _frame_rep(frame) -> str:
+    return "nothing" if frame is None else byte_to_string_rep(frame)
+
+
+def main(argv=None):
+    argparser = ArgumentParser(description="Replay a recorded dongle session.")
+    argparser.add_argument(
+        "log", help="Log file written by pv_dongle --record"
+    )
+    argparser.add_argument(
+        "--speed",
+        default=1.0,
+        type=float,
+        help="Replay speed factor. default is %(default)s",
+    )
+    argparser.add_argument(
+        "--fast", action="store_true", help="Send every frame without waiting"
+    )
+    argparser.add_argument(
+        "--dump",
+        action="store_true",
+        help="Print the frames instead of replaying",
+    )
+    args = argparser.parse_args(argv)
+
+    started, records = read_log(args.log)
+    if args.dump:
+        print_dump(started, records)
+        return 0
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        result = loop.run_until_complete(
+            replay(loop, records, None if args.fast else args.speed)
+        )
+    finally:
+        loop.close()
+    print(
+        "replayed {} frames in {:.3f} s, {} mismatches, {} errors".format(
+            result.frames,
+            result.duration,
+            len(result.mismatches),
+            result.errors,
+        )
+    )
+    for idx, expected, replayed in result.mismatches:
+        print(
+            "frame {}: recorded {} replayed {}".format(
+                idx, _frame_rep(expected), _frame_rep(replayed)
+            )
+        )
+    if result.mismatches or result.errors:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
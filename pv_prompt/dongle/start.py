@@ -10,26 +10,35 @@ from pv_prompt.base_prompts import (
     YesNoPrompt,
     QuitException,
 )
-from pv_prompt.dongle.dongle import State, Connect, NordicSerial
+from pv_prompt.dongle.codec import ActivateScene
+from pv_prompt.dongle.dongle import (
+    DEFAULT_FRAME_SPACING,
+    Connect,
+    NordicConnectionProblem,
+    NordicSerial,
+)
 from pv_prompt.dongle.nordic import Nd
+from pv_prompt.dongle.recorder import Recorder
 from pv_prompt.helpers import set_verbosity
 from pv_prompt.print_output import (
     info,
     warn,
-    print_waiting_done,
     print_key_values,
 )
+from pv_prompt.progress import operation
 
 LOGGER = logging.getLogger(__name__)
 
 
-def activate_scene(scene_id):
-    activate = b"\x00\x03SG" + bytes((scene_id,))
-    return activate
-
-
 class MainMenu(BasePrompt):
-    def __init__(self, loop, port=None, verbose=False):
+    def __init__(
+        self,
+        loop,
+        port=None,
+        verbose=False,
+        frame_spacing=DEFAULT_FRAME_SPACING,
+        record=None,
+    ):
         self.loop = loop
         super().__init__()
 
@@ -37,7 +46,11 @@ class MainMenu(BasePrompt):
 
         self._register_commands()
         self._port = port
+        self._frame_spacing = frame_spacing
         self.s = None
+        self.recorder = None
+        if record:
+            self.recorder = Recorder(record, loop)
 
         # self.s = NordicSerial(loop, port)
 
@@ -57,12 +70,17 @@ class MainMenu(BasePrompt):
             _port = await Connect().current_prompt()
             if _port:
                 self._port = _port
-        self.s = NordicSerial(self.loop, self._port)
+        if self.s is not None:
+            self.s.close()
+        self.s = NordicSerial(
+            self.loop, self._port, frame_spacing=self._frame_spacing
+        )
+        if self.recorder is not None:
+            self.recorder.record(self.s.message_queue)
         print_key_values("network id", self.s.network_id)
-        done = print_waiting_done("Connecting to dongle")
-        while not self.s.state == State.connected:
-            await asyncio.sleep(0.5)
-        await done()
+        with operation("Connecting to dongle"):
+            while not self.s.connected:
+                await asyncio.sleep(0.5)
 
     async def current_prompt(
         self,
@@ -79,30 +97,31 @@ class MainMenu(BasePrompt):
         )
 
     async def _query_scenes(self, *args, **kwargs):
-        done = print_waiting_done("Moving to open position")
-        await self.s.write_to_nordic(Nd.open.value)
-        await asyncio.sleep(3)
-        await done()
+        with operation("Moving to open position"):
+            await self.s.write(Nd.open.value, expect_response=False)
+            await asyncio.sleep(3)
         for scene_idx in range(0, 32):
-            if not self.s.state == State.connected:
+            if not self.s.connected:
                 await self._connect_dongle()
             info("Activating scene {}".format(scene_idx))
-            await self.s.write_to_nordic(activate_scene(scene_idx))
-            done = print_waiting_done("Watch for response")
-            await asyncio.sleep(2)
-            await done()
+            await self.s.write(ActivateScene(scene_idx), expect_response=False)
+            with operation("Watch for response"):
+                await asyncio.sleep(2)
 
     async def _jog(self, *args, **kwargs):
-        done = print_waiting_done("Jogging")
-        await self.s.write_to_nordic(Nd.JOG.value)
-        await done()
+        with operation("Jogging"):
+            await self.s.write(Nd.JOG.value, expect_response=False)
 
     async def _connect_shade(self, *args, **kwargs):
         print("Press shade button")
         await asyncio.sleep(3)
-        await self.s.write_to_nordic(Nd.NETWORKADD.value)
-        await asyncio.sleep(0.5)
-        await self.s.write_to_nordic(Nd.GROUP_ADD.value)
+        try:
+            await asyncio.gather(
+                *self.s.submit_batch([Nd.NETWORKADD, Nd.GROUP_ADD])
+            )
+        except NordicConnectionProblem:
+            warn("Problem writing to the dongle.")
+            return
 
         yesno = YesNoPrompt()
         confirm = await yesno.current_prompt(
@@ -126,6 +145,15 @@ def main():
         type=int,
     )
     argparser.add_argument("--verbose", action="store_true", default=False)
+    argparser.add_argument(
+        "--frame-spacing",
+        default=DEFAULT_FRAME_SPACING,
+        help="Seconds between dongle frames. default is %(default)s",
+        type=float,
+    )
+    argparser.add_argument(
+        "--record", help="Record the serial traffic to this file", default=None
+    )
     args = argparser.parse_args()
 
     logging.basicConfig(level=args.loglevel)
@@ -135,10 +163,15 @@ def main():
 
     _main = None
     try:
-        _main = MainMenu(loop, args.port, args.verbose)
+        _main = MainMenu(
+            loop, args.port, args.verbose, args.frame_spacing, args.record
+        )
         loop.run_until_complete(_main.current_prompt())
     except QuitException:
         print("closing pv toolkit")
+    finally:
+        if _main is not None and _main.recorder is not None:
+            _main.recorder.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+"""Non blocking serial transport for the nordic dongle.
+
+A reader thread blocks on the serial port and hands received bytes to the
+event loop. There a `codec.FrameDecoder` cuts them into frames, which are
+put on a queue, so a response is available as soon as its last byte has
+arrived.
+"""
+
+import asyncio
+import logging
+
+from pv_prompt.dongle.codec import FrameDecoder
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds the reader thread blocks in a read when cancel_read is not
+# supported by the platform.
+READ_TIMEOUT = 1
+
+
+class _ThreadProtocol:
+    """pyserial reader thread protocol handing everything to the loop."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def connection_made(self, reader_thread):
+        pass
+
+    def data_received(self, data):
+        self.transport.loop.call_soon_threadsafe(
+            self.transport.data_received, data
+        )
+
+    def connection_lost(self, exc):
+        self.transport.loop.call_soon_threadsafe(
+            self.transport.connection_lost, exc
+        )
+
+
+class SerialTransport:
+    """Serial port connection delivering received frames on a queue."""
+
+    def __init__(self, loop, port, baudrate=38400):
+        self.loop = loop
+        self.port = port
+        self.baudrate = baudrate
+        self.frames = asyncio.Queue()
+        self._decoder = FrameDecoder()
+        self._serial = None
+        self._thread = None
+
+    @property
+    def is_open(self):
+        return self._thread is not None and self._thread.alive
+
+    def open(self):
+        """Open the serial port and start reading.
+
+        :raises serial.SerialException when the port cannot be opened."""
+        from serial import Serial
+        from serial.threaded import ReaderThread
+
+        self._serial = Serial(
+            self.port, baudrate=self.baudrate, timeout=READ_TIMEOUT
+        )
+        self._thread = ReaderThread(
+            self._serial, lambda: _ThreadProtocol(self)
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        LOGGER.info("Connected to serial port %s", self.port)
+
+    def close(self):
+        if self._thread is not None:
+            self._thread.close()
+            self._thread = None
+        self._serial = None
+
+    def write(self, data):
+        """Write bytes to the port.
+
+        :raises serial.SerialException on a write problem.
+        :raises AttributeError when the port is not open."""
+        self._serial.write(data)
+
+    def data_received(self, data):
+        LOGGER.debug("received: %s", data)
+        for frame in self._decoder.feed(data):
+            self.frames.put_nowait(frame)
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            LOGGER.error("Serial connection lost: %s", exc)
+        self._thread = None
+
+    def discard(self):
+        """Forget received bytes and frames nobody waited for."""
+        self._decoder.clear()
+        while not self.frames.empty():
+            LOGGER.debug("discarding: %s", self.frames.get_nowait())
+
+    async def read_frame(self, timeout) -> bytes:
+        """Wait for the next frame.
+
+        :raises asyncio.TimeoutError when no frame arrives in time."""
+        return await asyncio.wait_for(self.frames.get(), timeout)
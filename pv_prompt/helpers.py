@@ -6,6 +6,15 @@ _LOOP = None
 
 _VERBOSE = False
 
+# Print raw hub data without colors.
+_PLAIN = False
+
+# Rows shown before a listing waits for the user. No paging when 0.
+_PAGE_SIZE = 0
+
+# Seconds to wait for hubs to answer a discovery.
+DEFAULT_DISCOVERY_TIMEOUT = 5
+
 
 def VERBOSE():
     return _VERBOSE
@@ -17,6 +26,24 @@ def set_verbosity(verbose=True):
     LOGGER.debug("Verbose: %s", _VERBOSE)
 
 
+def PLAIN():
+    return _PLAIN
+
+
+def set_plain(plain=True):
+    global _PLAIN
+    _PLAIN = plain
+
+
+def PAGE_SIZE():
+    return _PAGE_SIZE
+
+
+def set_page_size(page_size=0):
+    global _PAGE_SIZE
+    _PAGE_SIZE = page_size
+
+
 def get_loop():
     """Return a default asyncio event loop."""
     global _LOOP
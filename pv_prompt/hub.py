@@ -0,0 +1,125 @@
+"""Keeps track of all connected hubs."""
+
+import asyncio
+import logging
+from collections import namedtuple, OrderedDict
+
+import aiohttp
+
+from pv_prompt.progress import operation
+from pv_prompt.resource_cache import HubCache, DEFAULT_CONCURRENCY, DEFAULT_TTL
+from pv_prompt.scheduler import ScheduledRequest
+from pv_prompt.snapshot import snapshot_path
+from pv_prompt.stats import transfer_trace
+
+LOGGER = logging.getLogger(__name__)
+
+# Maximum number of open connections to a single hub.
+DEFAULT_CONNECTIONS_PER_HUB = 4
+
+HubSession = namedtuple("HubSession", ["address", "request", "hub_cache"])
+
+
+def hub_address(hub) -> str:
+    """Normalize a hub address like http://192.168.2.4/ to 192.168.2.4"""
+    return hub.split("://")[-1].strip("/")
+
+
+class HubRegistry:
+    """All hubs connected to in this session.
+
+    The hubs share one aiohttp session. Its connection pool keeps at
+    most `connections_per_hub` connections open to every hub.
+    """
+
+    def __init__(
+        self,
+        loop,
+        concurrency=DEFAULT_CONCURRENCY,
+        ttl=DEFAULT_TTL,
+        use_snapshot=True,
+        connections_per_hub=DEFAULT_CONNECTIONS_PER_HUB,
+        poll=False,
+    ):
+        self.loop = loop
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.use_snapshot = use_snapshot
+        self.connections_per_hub = connections_per_hub
+        self.poll = poll
+        self._websession = None
+        self._sessions = OrderedDict()
+        self.current = None
+
+    def __contains__(self, hub):
+        return hub_address(hub) in self._sessions
+
+    def __iter__(self):
+        return iter(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def websession(self):
+        if self._websession is None:
+            self._websession = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self.connections_per_hub
+                ),
+                trace_configs=[transfer_trace()],
+            )
+        return self._websession
+
+    def add(self, hub) -> HubSession:
+        """Add a hub and make it the current one.
+
+        A hub which is already known is reused."""
+        address = hub_address(hub)
+        session = self._sessions.get(address)
+        if session is None:
+            request = ScheduledRequest(
+                address, loop=self.loop, websession=self.websession
+            )
+            hub_cache = HubCache(
+                request,
+                self.loop,
+                self.concurrency,
+                self.ttl,
+                snapshot_path(address) if self.use_snapshot else None,
+            )
+            session = HubSession(address, request, hub_cache)
+            self._sessions[address] = session
+            if self.poll:
+                hub_cache.start_poller()
+        self.current = session
+        return session
+
+    def switch(self, hub) -> HubSession:
+        """Make a known hub the current one."""
+        self.current = self._sessions[hub_address(hub)]
+        return self.current
+
+    async def update_all(self, force=False):
+        """Update the caches of all hubs concurrently."""
+        with operation("getting data of {} hubs".format(len(self))):
+            await asyncio.gather(
+                *(
+                    session.hub_cache.update(force=force, quiet=True)
+                    for session in self
+                )
+            )
+
+    def shades(self):
+        """Stream (hub session, shade) tuples of all hubs."""
+        for session in self:
+            for shade in session.hub_cache.shades:
+                yield session, shade
+
+    async def close(self):
+        for session in self:
+            session.hub_cache.stop()
+            session.request.stop()
+        if self._websession is not None:
+            await self._websession.close()
+            self._websession = None
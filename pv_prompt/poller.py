@@ -0,0 +1,163 @@
+"""Keeps shade positions and battery states up to date in the background."""
+
+import asyncio
+import logging
+import time
+from collections import namedtuple, deque
+
+from aiopvapi.helpers.aiorequest import PvApiError
+from aiopvapi.helpers.constants import ATTR_POSITION_DATA
+
+from pv_prompt.base_prompts import InvalidIdException
+from pv_prompt.scheduler import background
+
+LOGGER = logging.getLogger(__name__)
+
+ATTR_BATTERY_STATUS = "batteryStatus"
+ATTR_BATTERY_STRENGTH = "batteryStrength"
+
+# Seconds between polls right after a shade has been moved.
+DEFAULT_FAST_INTERVAL = 2
+# Seconds between polls when nothing happens.
+DEFAULT_SLOW_INTERVAL = 60
+# Seconds polling stays fast after a move.
+DEFAULT_FAST_PERIOD = 30
+# Seconds between battery level refreshes of a single shade.
+DEFAULT_BATTERY_INTERVAL = 300
+
+ShadeUpdate = namedtuple(
+    "ShadeUpdate", ["timestamp", "shade_id", "name", "positions", "battery"]
+)
+
+
+def shade_state(shade):
+    """The part of the shade data the poller watches."""
+    raw = shade.raw_data
+    return (
+        raw.get(ATTR_POSITION_DATA),
+        raw.get(ATTR_BATTERY_STATUS),
+        raw.get(ATTR_BATTERY_STRENGTH),
+    )
+
+
+class ShadePoller:
+    """Polls shade state on an adaptive schedule.
+
+    Polling is slow when idle. After `kick` it polls the moved shades fast
+    for a while. Changes end up in the hub cache and in `feed`. The
+    requests are sent at background priority, so they are limited by the
+    request scheduler of the hub together with all other requests.
+    """
+
+    def __init__(
+        self,
+        hub_cache,
+        fast_interval=DEFAULT_FAST_INTERVAL,
+        slow_interval=DEFAULT_SLOW_INTERVAL,
+        fast_period=DEFAULT_FAST_PERIOD,
+        battery_interval=DEFAULT_BATTERY_INTERVAL,
+        feed_length=100,
+    ):
+        self.hub_cache = hub_cache
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.fast_period = fast_period
+        self.battery_interval = battery_interval
+        self.feed = deque(maxlen=feed_length)
+        self._fast_until = 0
+        self._moved = set()
+        self._battery_due = 0
+        self._battery_index = 0
+        self._task = None
+        self._wakeup = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def interval(self):
+        if time.monotonic() < self._fast_until:
+            return self.fast_interval
+        return self.slow_interval
+
+    def start(self):
+        if not self.running:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(
+                self._run(), loop=self.hub_cache.loop
+            )
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def kick(self, *shade_ids):
+        """Poll fast for a while. Called after a shade has been moved."""
+        self._moved.update(shade_ids)
+        self._fast_until = time.monotonic() + self.fast_period
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            # cleared before polling, a kick during the poll is not lost.
+            self._wakeup.clear()
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except PvApiError as err:
+                LOGGER.warning("Polling shades failed: %s", err)
+            except Exception:
+                LOGGER.exception("Polling shades failed.")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _record(self, before, shades):
+        """Add shades with a changed state to the feed."""
+        now = time.time()
+        for shade in shades:
+            state = shade_state(shade)
+            if before.get(shade.id) != state:
+                self.feed.append(
+                    ShadeUpdate(now, shade.id, shade.name, state[0], state[1:])
+                )
+
+    async def poll(self):
+        """Poll once."""
+        with background():
+            shades = self.hub_cache.shades
+            before = {shade.id: shade_state(shade) for shade in shades}
+            if self._moved and time.monotonic() < self._fast_until:
+                await self._poll_moved(shades)
+            else:
+                self._moved.clear()
+                await shades.fetch()
+            self._record(before, shades)
+            await self._poll_battery(shades)
+
+    async def _poll_moved(self, shades):
+        for shade_id in list(self._moved):
+            try:
+                await shades.find_by_id(shade_id).refresh()
+            except (InvalidIdException, PvApiError) as err:
+                LOGGER.debug("Unable to refresh shade %s: %s", shade_id, err)
+                self._moved.discard(shade_id)
+
+    async def _poll_battery(self, shades):
+        """Refresh the battery level of one shade at a time."""
+        if not len(shades) or time.monotonic() < self._battery_due:
+            return
+        self._battery_index %= len(shades)
+        shade = shades.resources[self._battery_index]
+        self._battery_index += 1
+        self._battery_due = time.monotonic() + self.battery_interval / len(
+            shades
+        )
+        before = {shade.id: shade_state(shade)}
+        await shade.refreshBattery()
+        self._record(before, [shade])
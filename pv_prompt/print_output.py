@@ -1,18 +1,45 @@
-import asyncio
 import json
 import logging
-from asyncio import CancelledError
+import re
+import sys
+import time
 from typing import TYPE_CHECKING, Iterable
 
-import pygments
-from prompt_toolkit import print_formatted_text, HTML
-from prompt_toolkit.formatted_text import PygmentsTokens
-from pygments.lexers.data import JsonLexer
+from prompt_toolkit import print_formatted_text, prompt, HTML
+from prompt_toolkit.formatted_text import FormattedText
 
-from pv_prompt.helpers import VERBOSE
+from pv_prompt.helpers import VERBOSE, PAGE_SIZE, PLAIN
+from pv_prompt.progress import interrupt
 
 LOGGER = logging.getLogger(__name__)
 
+# Fragments written to the terminal at once when printing json.
+FLUSH_FRAGMENTS = 4096
+
+_JSON_ENCODER = json.JSONEncoder(indent=4)
+# Json tokens, styled like the pygments json lexer styles them. Matched
+# inside one chunk of _JSON_ENCODER.iterencode. Keys are chunks of their
+# own, followed by a chunk starting with the ":" separator.
+_JSON_TOKEN = re.compile(
+    r'(?P<string>"(?:[^"\\]|\\.)*")'
+    r"|(?P<float>-?\d+(?:\.\d+)?[eE][-+]?\d+|-?\d+\.\d+)"
+    r"|(?P<integer>-?\d+)"
+    r"|(?P<constant>true|false|null|NaN|-?Infinity)"
+    r"|(?P<punctuation>[\[\]{},:]+)"
+    r"|(?P<whitespace>\s+)"
+    r"|(?P<other>.)"
+)
+_JSON_STYLES = {
+    "key": "class:pygments.name.tag",
+    "string": "class:pygments.literal.string.double",
+    "float": "class:pygments.literal.number.float",
+    "integer": "class:pygments.literal.number.integer",
+    "constant": "class:pygments.keyword.constant",
+    "punctuation": "class:pygments.punctuation",
+    "whitespace": "class:pygments.text",
+    "other": "",
+}
+
 if TYPE_CHECKING:
     from pv_prompt.resource_cache import ResourceCache
 
@@ -35,55 +62,179 @@ def print_tabbed_data(*row):
     _columns = len(row)
 
 
-def info(text, **kwargs):
-    print_formatted_text(HTML("  <green>{}</green>".format(text)), **kwargs)
+class Table:
+    """Table printed in a single write.
+
+    Column widths follow the data. The first column is green, the others
+    orange, like `print_table`."""
+
+    gap = 2
+
+    def __init__(self, *headers):
+        self.headers = [str(_header) for _header in headers]
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_row(self, *values):
+        self.rows.append([str(_value) for _value in values])
+
+    def add_rows(self, rows: Iterable):
+        for _row in rows:
+            self.add_row(*_row)
+
+    def widths(self) -> list:
+        widths = [len(_header) for _header in self.headers]
+        for _row in self.rows:
+            for _idx, _value in enumerate(_row):
+                if len(_value) > widths[_idx]:
+                    widths[_idx] = len(_value)
+        return [_width + self.gap for _width in widths]
+
+    def fragments(self, start=0, stop=None, footer=True) -> FormattedText:
+        """Formatted text of the header and the rows from start to stop."""
+        widths = self.widths()
+        first, rest = widths[0], widths[1:]
+
+        def _line(row):
+            return [
+                ("", "  "),
+                ("class:green", row[0].ljust(first)),
+                (
+                    "class:orange",
+                    "".join(
+                        _value.ljust(_width)
+                        for _value, _width in zip(row[1:], rest)
+                    )
+                    + "\n",
+                ),
+            ]
+
+        fragments = [("", "\n")]
+        fragments.extend(_line(self.headers))
+        fragments.extend(
+            _line(["-" * len(_header) for _header in self.headers])
+        )
+        for _row in self.rows[start:stop]:
+            fragments.extend(_line(_row))
+        if footer:
+            fragments.append(
+                (
+                    "class:green",
+                    "\n  {} items found.\n\n".format(len(self.rows)),
+                )
+            )
+        return FormattedText(fragments)
+
+    def print(self, footer=True):
+        print_formatted_text(self.fragments(footer=footer), end="")
+
+
+async def print_paged(table: Table, page_size=None):
+    """Print a table a page at a time.
+
+    :param page_size: Rows per page. Defaults to the --page-size setting.
+        The whole table is printed at once when 0.
+    """
+    page_size = PAGE_SIZE() if page_size is None else page_size
+    if not page_size or len(table) <= page_size:
+        table.print()
+        return
+    for start in range(0, len(table), page_size):
+        stop = start + page_size
+        last = stop >= len(table)
+        print_formatted_text(table.fragments(start, stop, footer=last), end="")
+        if last:
+            return
+        answer = await prompt(
+            "  {} of {} shown. Enter for more, q to stop: ".format(
+                stop, len(table)
+            ),
+            async_=True,
+        )
+        if answer.strip().lower() == "q":
+            return
 
 
-def spinner():
-    print_formatted_text(HTML("<orange>.</orange>"), end="")
+def info(text, **kwargs):
+    with interrupt():
+        print_formatted_text(
+            HTML("  <green>{}</green>".format(text)), **kwargs
+        )
 
 
 def warn(text):
-    print_formatted_text(HTML("  <ansired>{}</ansired>".format(text)))
+    with interrupt():
+        print_formatted_text(HTML("  <ansired>{}</ansired>".format(text)))
 
 
-def print_waiting_done(action):
-    async def waiting():
-        info(action, end="")
-        try:
-            while True:
-                await asyncio.sleep(0.5)
-                spinner()
-        except CancelledError:
-            pass
+def _json_tokens(chunk):
+    for match in _JSON_TOKEN.finditer(chunk):
+        yield _JSON_STYLES[match.lastgroup], match.group()
 
-    task = asyncio.ensure_future(waiting())
 
-    async def _finished():
-        info("done")
-        # todo: make the wile loop not infinite as it might hang indefinitely
-        task.cancel()
-        while not task.cancelled:
-            await asyncio.sleep(0.5)
+def json_fragments(data):
+    """Stream the highlighted formatted text fragments of data as json."""
+    previous = None
+    for chunk in _JSON_ENCODER.iterencode(data):
+        if previous is not None:
+            if chunk.startswith(":"):
+                yield _JSON_STYLES["key"], previous
+            else:
+                yield from _json_tokens(previous)
+        previous = chunk
+    if previous is not None:
+        yield from _json_tokens(previous)
 
-    return _finished
 
+def print_fragments(fragments: Iterable):
+    """Print a stream of fragments, FLUSH_FRAGMENTS at a time."""
+    buffer = []
+    for fragment in fragments:
+        buffer.append(fragment)
+        if len(buffer) >= FLUSH_FRAGMENTS:
+            print_formatted_text(FormattedText(buffer), end="")
+            buffer = []
+    if buffer:
+        print_formatted_text(FormattedText(buffer), end="")
 
-def print_dict(data: dict):
-    tokens = list(pygments.lex(json.dumps(data, indent=4), lexer=JsonLexer()))
-    print_formatted_text(PygmentsTokens(tokens))
 
+def print_dicts(items: Iterable, plain=None):
+    """Print many dicts as json in as few writes as possible.
 
-def print_scenes(scenes: "ResourceCache", rooms):
-    LOGGER.debug("verbose: %s", VERBOSE)
+    :param plain: Print without colors. Defaults to the --plain setting.
+    """
+    if plain is None:
+        plain = PLAIN()
+    if plain:
+        for data in items:
+            sys.stdout.writelines(_JSON_ENCODER.iterencode(data))
+            sys.stdout.write("\n")
+        sys.stdout.flush()
+        return
+
+    def _fragments():
+        for data in items:
+            yield from json_fragments(data)
+            yield "", "\n"
+
+    print_fragments(_fragments())
+
+
+def print_dict(data: dict, plain=None):
+    print_dicts([data], plain)
+
+
+def print_raw(items: Iterable):
+    """Print the raw data of every item when in verbose mode."""
     if VERBOSE():
         print("")
-        for itm in scenes.resources:
-            print_dict(itm._raw_data)
-    print("")
-    LOGGER.debug("printing scenes")
-    print_table("NAME", "ID", "ROOM", "NETWORK_ID")
-    print_table("----", "--", "----", "----------")
+        print_dicts(itm._raw_data for itm in items)
+
+
+def scene_table(scenes: "ResourceCache", rooms) -> Table:
+    table = Table("NAME", "ID", "ROOM", "NETWORK_ID")
     tbl = [
         (
             _item.name,
@@ -94,36 +245,139 @@ def print_scenes(scenes: "ResourceCache", rooms):
         for _item in scenes.resources
     ]
     tbl.sort(key=lambda x: x[-1])
+    table.add_rows(tbl)
+    return table
+
 
-    for _ln in tbl:
-        print_table(*_ln)
-    print_length(len(scenes.resources))
+def print_scenes(scenes: "ResourceCache", rooms):
+    LOGGER.debug("verbose: %s", VERBOSE)
+    print_raw(scenes.resources)
+    LOGGER.debug("printing scenes")
+    scene_table(scenes, rooms).print()
+
+
+def shade_table(shades: Iterable) -> Table:
+    table = Table("NAME", "ID", "TYPE")
+    table.add_rows(
+        (_item.name, _item.id, _item.shade_type.description)
+        for _item in shades
+    )
+    return table
 
 
 def print_shade_data(shades: Iterable):
-    """Prints a list of shades.
+    """Prints a list of shades."""
+    shades = list(shades)
+    print_raw(shades)
+    shade_table(shades).print()
+
+
+def hub_shade_table(hub_shades: Iterable) -> Table:
+    """Table of the shades of many hubs.
+
+    :param hub_shades: (hub session, shade) tuples.
     """
-    if VERBOSE():
-        print("")
-        for itm in shades:
-            print_dict(itm._raw_data)
-    print_table("NAME", "ID", "TYPE")
-    print_table("----", "--", "----")
-    count = 0
-    LOGGER.debug(shades)
-    for _item in shades:
-        count += 1
-        print_table(_item.name, _item.id, _item.shade_type.description)
-    print_length(count)
+    table = Table("HUB", "NAME", "ID", "TYPE")
+    for _session, _item in hub_shades:
+        hub_name = _session.hub_cache.user_data.hub_name or _session.address
+        table.add_row(
+            hub_name, _item.name, _item.id, _item.shade_type.description
+        )
+    return table
+
+
+def print_shade_updates(updates: Iterable):
+    """Print shade changes found by the poller."""
+    table = Table("TIME", "ID", "NAME", "POSITIONS", "BATTERY")
+    table.add_rows(
+        (
+            time.strftime("%H:%M:%S", time.localtime(_update.timestamp)),
+            _update.shade_id,
+            _update.name,
+            _update.positions,
+            _update.battery,
+        )
+        for _update in updates
+    )
+    table.print()
+
+
+def print_scene_members(members: Iterable):
+    """Print the shades of a scene.
+
+    :param members: (shade name, shade id, positions) tuples.
+    """
+    table = Table("SHADE", "ID", "POSITIONS")
+    table.add_rows(members)
+    table.print()
+
+
+def print_shade_scenes(scenes: Iterable):
+    """Print the scenes a shade is a member of.
+
+    :param scenes: (scene name, scene id, positions) tuples.
+    """
+    table = Table("SCENE", "ID", "POSITIONS")
+    table.add_rows(scenes)
+    table.print()
 
 
 def print_resource_data(resource):
+    table = Table("NAME", "ID")
+    table.add_rows((_item.name, _item.id) for _item in resource.resources)
+    table.print()
+
+
+def print_bulk_results(results):
+    """Print the outcome of a bulk operation."""
+    table = Table("NAME", "ID", "RESULT", "TIME")
+    failed = 0
+    for _result in results:
+        if _result.ok:
+            status = "ok"
+        else:
+            status = _result.error
+            failed += 1
+        table.add_row(
+            _result.name,
+            _result.id,
+            status,
+            "{:.2f} s".format(_result.duration),
+        )
+    table.print(footer=False)
+    print("")
+    info("{} of {} succeeded.".format(len(results) - failed, len(results)))
+    if failed:
+        warn("{} failed.".format(failed))
     print("")
-    print_table("NAME", "ID")
-    print_table("----", "--")
-    for _item in resource.resources:
-        print_table(_item.name, _item.id)
-    print_length(len(resource.resources))
+
+
+def _milliseconds(seconds):
+    if seconds is None:
+        return "-"
+    return "{:.0f} ms".format(seconds * 1000)
+
+
+def print_request_stats(stats):
+    """Print the request statistics of a hub, per endpoint."""
+    print("")
+    info("hub: {}".format(stats.hub_ip))
+    table = Table(
+        "ENDPOINT", "COUNT", "ERRORS", "RETRIES", "P50", "P95", "P99", "KB IN"
+    )
+    for _name, _stats in stats:
+        latency = _stats.latency
+        table.add_row(
+            _name,
+            _stats.requests,
+            _stats.error_count,
+            _stats.retries,
+            _milliseconds(latency.percentile(50)),
+            _milliseconds(latency.percentile(95)),
+            _milliseconds(latency.percentile(99)),
+            "{:.1f}".format(_stats.bytes_received / 1024),
+        )
+    table.print()
 
 
 def print_length(length):
@@ -0,0 +1,186 @@
+"""Progress of running operations.
+
+All operations are drawn by a single refresh task. On a terminal the
+status lines are redrawn in place: one line per operation with its
+completed and total counts and the elapsed time, and one line per item
+in flight. Elsewhere only a line per finished operation is printed.
+
+Usage::
+
+    with operation("Opening shades", total=len(shades)) as op:
+        await bulk.open_shades(shades, progress=op)
+
+Output written during an operation goes through `interrupt`, as `info`
+and `warn` do, or the next redraw erases it.
+"""
+
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+
+# Seconds between redraws.
+DEFAULT_INTERVAL = 0.5
+# Items in flight drawn per operation.
+MAX_ITEM_LINES = 8
+
+_CURSOR_UP = "\x1b[{}F"
+_CLEAR_DOWN = "\x1b[J"
+
+
+class Operation:
+    """A running operation, optionally consisting of items."""
+
+    def __init__(self, progress, name, total=None):
+        self.progress = progress
+        self.name = name
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.in_flight = {}
+
+    def __enter__(self):
+        self.progress.add(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.progress.remove(self)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def begin(self, item):
+        """An item has started."""
+        self.in_flight[item] = time.monotonic()
+
+    def end(self, item, ok=True):
+        """An item has finished."""
+        self.in_flight.pop(item, None)
+        self.completed += 1
+        if not ok:
+            self.failed += 1
+
+    def count(self) -> str:
+        if self.total is None:
+            return ""
+        return " {}/{}".format(self.completed, self.total)
+
+    def status_lines(self) -> list:
+        lines = [
+            "  {}{} {:.1f} s".format(self.name, self.count(), self.elapsed)
+        ]
+        now = time.monotonic()
+        for item, started in list(self.in_flight.items())[:MAX_ITEM_LINES]:
+            lines.append("    {} {:.1f} s".format(item, now - started))
+        hidden = len(self.in_flight) - MAX_ITEM_LINES
+        if hidden > 0:
+            lines.append("    {} more".format(hidden))
+        return lines
+
+    def summary(self) -> str:
+        failed = ", {} failed".format(self.failed) if self.failed else ""
+        return "  {}{} done in {:.1f} s{}".format(
+            self.name, self.count(), self.elapsed, failed
+        )
+
+
+class Progress:
+    """Draws all running operations from one refresh task."""
+
+    def __init__(self, output=None, interval=DEFAULT_INTERVAL, redraw=None):
+        """
+        :param output: Stream to write to. Defaults to stdout.
+        :param redraw: Redraw the status lines in place. Defaults to True
+            on a terminal.
+        """
+        self._output = output
+        self.interval = interval
+        self._redraw = redraw
+        self.operations = []
+        self._drawn = 0
+        self._task = None
+
+    @property
+    def output(self):
+        return self._output or sys.stdout
+
+    @property
+    def redraw(self):
+        if self._redraw is not None:
+            return self._redraw
+        isatty = getattr(self.output, "isatty", None)
+        return bool(isatty and isatty())
+
+    def operation(self, name, total=None) -> Operation:
+        return Operation(self, name, total)
+
+    def add(self, operation):
+        self.operations.append(operation)
+        if not self.redraw:
+            return
+        self.draw()
+        if self._task is None or self._task.done():
+            try:
+                self._task = asyncio.ensure_future(self._refresh())
+            except RuntimeError:
+                # no event loop, the operation is drawn when it finishes.
+                self._task = None
+
+    def remove(self, operation):
+        self.operations.remove(operation)
+        self._clear()
+        self.output.write(operation.summary() + "\n")
+        self.draw()
+
+    @contextmanager
+    def interrupt(self):
+        """Write other output while operations are drawn.
+
+        The status lines are cleared first and drawn again below the
+        output, so the output is not overwritten by the next redraw."""
+        self._clear()
+        self.output.flush()
+        try:
+            yield
+        finally:
+            if self.operations:
+                self.draw()
+
+    def _clear(self):
+        if self._drawn:
+            self.output.write(_CURSOR_UP.format(self._drawn) + _CLEAR_DOWN)
+            self._drawn = 0
+
+    def draw(self):
+        """Draw the status lines of all operations."""
+        if not self.redraw:
+            self.output.flush()
+            return
+        lines = [
+            line for _op in self.operations for line in _op.status_lines()
+        ]
+        self._clear()
+        if lines:
+            self.output.write("\n".join(lines) + "\n")
+        self._drawn = len(lines)
+        self.output.flush()
+
+    async def _refresh(self):
+        while self.operations:
+            await asyncio.sleep(self.interval)
+            self.draw()
+
+
+_PROGRESS = Progress()
+
+
+def operation(name, total=None) -> Operation:
+    """Show the progress of an operation while in its with block."""
+    return _PROGRESS.operation(name, total)
+
+
+def interrupt():
+    """Write output below the running operations."""
+    return _PROGRESS.interrupt()
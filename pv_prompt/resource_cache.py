@@ -1,7 +1,20 @@
 import asyncio
+import functools
+import time
+from collections import namedtuple
 
-from aiopvapi.helpers.aiorequest import AioRequest, PvApiConnectionError
+from aiopvapi.helpers.aiorequest import (
+    AioRequest,
+    PvApiConnectionError,
+    PvApiError,
+)
 from aiopvapi.helpers.api_base import ApiEntryPoint
+from aiopvapi.helpers.constants import (
+    ATTR_NAME,
+    ATTR_NAME_UNICODE,
+    ATTR_ROOM_ID,
+    ATTR_TYPE,
+)
 from aiopvapi.rooms import Rooms as PvRooms
 from aiopvapi.scene_members import SceneMembers as PvSceneMembers
 from aiopvapi.scenes import Scenes as PvScenes
@@ -10,17 +23,104 @@ from aiopvapi.hub import UserData
 from prompt_toolkit.completion import WordCompleter
 
 from pv_prompt.base_prompts import BasePrompt, InvalidIdException
-from pv_prompt.helpers import get_loop
-from pv_prompt.print_output import print_waiting_done
+from pv_prompt.helpers import get_loop, VERBOSE
+from pv_prompt.print_output import print_key_values, warn
+from pv_prompt.progress import operation
+from pv_prompt import snapshot
+from pv_prompt.poller import ShadePoller
+from pv_prompt.scene_index import SceneIndex
 
 import logging
 
 LOGGER = logging.getLogger(__name__)
 
+# Maximum number of simultaneous requests sent to the hub during a
+# cache update. Gen2 hubs start dropping requests when flooded.
+DEFAULT_CONCURRENCY = 3
 
-class ResourceCache:
+# Seconds cached hub data is considered fresh.
+DEFAULT_TTL = 60
+
+
+# aiopvapi has no public call turning collection data into resources
+# without fetching it. These wrap its private ones, setup.py pins the
+# aiopvapi versions they are known to work with.
+def raw_resources(entry_point: ApiEntryPoint, raw: dict):
+    """The raw data of every resource in collection data."""
+    return entry_point._loop_raw(raw)
+
+
+def create_resource(entry_point: ApiEntryPoint, raw: dict):
+    """Create a resource instance from its raw data."""
+    return entry_point._resource_factory(raw)
+
+
+def resource_name(raw: dict) -> str:
+    """The name of a resource, like `ApiResource.name`."""
+    return raw.get(ATTR_NAME_UNICODE) or raw.get(ATTR_NAME) or ""
+
+
+class ChangeSet(namedtuple("ChangeSet", ["added", "removed", "modified"])):
+    """Ids of the resources changed by a cache refresh."""
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    def __str__(self):
+        return "{} added, {} removed, {} modified".format(
+            len(self.added), len(self.removed), len(self.modified)
+        )
+
+
+def single_flight(func):
+    """Let concurrent calls of a coroutine method share a single call.
+
+    Callers arriving while a call is in flight await its outcome instead
+    of starting their own. Cancelling one caller leaves the others
+    waiting."""
+    attribute = "_{}_in_flight".format(func.__name__)
+
+    def _done(instance, task):
+        setattr(instance, attribute, None)
+        if not task.cancelled():
+            # mark the exception as retrieved when no caller is left.
+            task.exception()
+
+    @functools.wraps(func)
+    async def wrapper(self):
+        task = getattr(self, attribute, None)
+        if task is None:
+            task = asyncio.ensure_future(func(self))
+            setattr(self, attribute, task)
+            task.add_done_callback(functools.partial(_done, self))
+        return await asyncio.shield(task)
+
+    return wrapper
+
+
+class Freshness:
+    """Keeps track of the moment cached data was last refreshed."""
+
+    last_update = None
+
+    def touch(self):
+        self.last_update = time.monotonic()
+
+    def invalidate(self):
+        self.last_update = None
+
+    def is_stale(self, ttl):
+        if self.last_update is None:
+            return True
+        return time.monotonic() - self.last_update > ttl
+
+
+class ResourceCache(Freshness):
     """PowerView resource cache."""
 
+    # Incremented every time the resources change.
+    version = 0
+
     def __init__(
         self,
         api_entry_point: ApiEntryPoint,
@@ -30,6 +130,10 @@ class ResourceCache:
         self.request = request
         self.api_entry_point = api_entry_point
         self.resources = []
+        self.raw = None
+        self._by_id = {}
+        self._by_name = {}
+        self._by_room_id = {}
         self.id_suggestions = []
         self.resource_type_name = resource_type_name
 
@@ -39,19 +143,61 @@ class ResourceCache:
     def __len__(self):
         return len(self.resources)
 
+    def _set_resources(self, resources, ids_changed=True, updates=()):
+        """Replace the cached resources and rebuild the lookup indexes.
+
+        The indexes are built aside and swapped in together so lookups never
+        see a half built state.
+
+        :param updates: (resource, raw data) of resources updated in place.
+            The indexes are built from the new data, which is set on the
+            resources after the swap."""
+        new_raw = {id(_item): _raw for _item, _raw in updates}
+        by_id = {}
+        by_name = {}
+        by_room_id = {}
+        for _item in resources:
+            raw = new_raw.get(id(_item), _item.raw_data)
+            by_id[_item.id] = _item
+            by_name.setdefault(resource_name(raw), []).append(_item)
+            by_room_id.setdefault(raw.get(ATTR_ROOM_ID), []).append(_item)
+        self.resources, self._by_id, self._by_name, self._by_room_id = (
+            resources,
+            by_id,
+            by_name,
+            by_room_id,
+        )
+        for _item, _raw in updates:
+            _item.raw_data = _raw
+        self.version += 1
+        if ids_changed:
+            self._populate_id_suggestions()
+
+    def get_by_id(self, _id):
+        """Return the resource with this id or None."""
+        return self._by_id.get(_id)
+
     def get_name_by_id(self, _id):
-        for _item in self.resources:
-            if _item.id == _id:
-                return _item.name
+        _item = self._by_id.get(_id)
+        if _item is not None:
+            return _item.name
 
     def _populate_id_suggestions(self):
-        self.id_suggestions = WordCompleter([str(_item.id) for _item in self.resources])
+        self.id_suggestions = WordCompleter([str(_id) for _id in self._by_id])
 
     def find_by_id(self, id_: int):
-        for _item in self.resources:
-            if _item.id == id_:
-                return _item
-        raise InvalidIdException("No data found for id {}".format(id_))
+        try:
+            return self._by_id[id_]
+        except KeyError:
+            raise InvalidIdException("No data found for id {}".format(id_))
+
+    def find_by_name(self, name) -> list:
+        """Return all resources with this name."""
+        return list(self._by_name.get(name, ()))
+
+    def find_by_room_id(self, room_id) -> list:
+        """Return all resources belonging to this room."""
+        return list(self._by_room_id.get(room_id, ()))
 
     def _validate_id(self, _id):
         if _id is None:
@@ -62,22 +208,28 @@ class ResourceCache:
         except ValueError:
             raise InvalidIdException("Incorrect ID.")
 
-    def list_resources(self, filter=None):
+    def list_resources(self, filter=None, room_id=None):
         """Generator expression.
 
-        Return a stream of items."""
+        Return a stream of items.
+
+        :param filter: Callable returning True for items to include.
+        :param room_id: Only include items belonging to this room.
+        """
+        if room_id is None:
+            _items = self.resources
+        else:
+            _items = self._by_room_id.get(room_id, ())
+        LOGGER.debug("Resource count: %s", len(_items))
         if filter is None:
             LOGGER.debug("No filter defined.")
-            filter = lambda x: True
-        LOGGER.debug("Resource count: %s", len(self.resources))
-        for _item in self.resources:
-            val = filter(_item)
-            LOGGER.debug("filter value: %s", val)
-            if val:
-                LOGGER.debug("yielding: %s", _item.name)
+            yield from _items
+            return
+        for _item in _items:
+            if filter(_item):
                 yield _item
 
-    async def select_resource(self, default=''):
+    async def select_resource(self, default=""):
         base_prompt = BasePrompt()
         resource = self._validate_id(
             await base_prompt.current_prompt(
@@ -90,36 +242,334 @@ class ResourceCache:
         )
         return resource
 
+    def load(self, raw: dict) -> ChangeSet:
+        """Update the resources with raw hub data.
+
+        Resources with unchanged data are kept as they are, modified ones
+        are updated in place once the new indexes are in place and only new
+        ones are created.
+
+        :return: The ids of the added, removed and modified resources.
+        """
+        entry_point = self.api_entry_point
+        resources = []
+        updates = []
+        added = []
+        modified = []
+        for _raw in raw_resources(entry_point, raw):
+            _item = self._by_id.get(_raw.get("id"))
+            if _item is None:
+                _item = create_resource(entry_point, _raw)
+                added.append(_item.id)
+            elif _item.raw_data != _raw:
+                if _item.raw_data.get(ATTR_TYPE) == _raw.get(ATTR_TYPE):
+                    updates.append((_item, _raw))
+                else:
+                    _item = create_resource(entry_point, _raw)
+                modified.append(_item.id)
+            resources.append(_item)
+        _ids = set(_item.id for _item in resources)
+        removed = [_id for _id in self._by_id if _id not in _ids]
+
+        changes = ChangeSet(added, removed, modified)
+        if changes:
+            self._set_resources(
+                resources, ids_changed=bool(added or removed), updates=updates
+            )
+        self.raw = raw
+        return changes
+
+    @single_flight
+    async def fetch(self):
+        """Fetch all resources from the hub.
+
+        Concurrent calls share one request.
+
+        :return: The changes compared to the previous fetch.
+        :raises PvApiError when a hub problem occurs."""
+        changes = self.load(await self.api_entry_point.get_resources())
+        self.touch()
+        return changes
+
+    def clear(self):
+        """Forget all resources."""
+        self._set_resources([])
+        self.raw = None
+        self.invalidate()
+
     async def get_resource(self):
-        done = print_waiting_done("getting {}s".format(self.resource_type_name))
+        with operation("getting {}s".format(self.resource_type_name)):
+            try:
+                await self.fetch()
+            except PvApiConnectionError as err:
+                warn(err)
+
+
+class UserDataCache(UserData, Freshness):
+    """Hub user data keeping track of its freshness."""
+
+    @property
+    def raw(self):
+        return self._raw
+
+    @property
+    def serial_number(self):
         try:
+            return self._raw["userData"]["serialNumber"]
+        except (KeyError, TypeError):
+            return None
 
-            self.resources = await self.api_entry_point.get_instances()
-            self._populate_id_suggestions()
-        except PvApiConnectionError as err:
-            print(err)
-        finally:
-            await done()
+    def load(self, raw: dict):
+        self.parse(raw)
+
+    @single_flight
+    async def fetch(self):
+        await self.update_user_data()
+        self.touch()
+        return None
 
 
 class HubCache:
     """Global state of the connected hub."""
 
-    def __init__(self, request, loop=None):
+    collections = ("shades", "rooms", "scenes", "scene_members", "user_data")
+
+    def __init__(
+        self,
+        request,
+        loop=None,
+        concurrency=DEFAULT_CONCURRENCY,
+        ttl=DEFAULT_TTL,
+        snapshot_path=None,
+    ):
+        self.request = request
         self.shades = ResourceCache(PvShades(request), "shade", request)
         self.rooms = ResourceCache(PvRooms(request), "room", request)
         self.scenes = ResourceCache(PvScenes(request), "scene", request)
         self.scene_members = ResourceCache(
             PvSceneMembers(request), "scene member", request
         )
-        self.user_data = UserData(request)
+        self.user_data = UserDataCache(request)
         self.loop = loop or get_loop()
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Duration in seconds of the last fetch of each collection.
+        self.timings = {}
+        # Changes found by the last fetch of each previously loaded collection.
+        self.changes = {}
+        self.snapshot_path = snapshot_path
+        # Unix time the loaded snapshot was saved.
+        self.snapshot_saved = None
+        # Serial number of the hub the loaded snapshot was taken from.
+        self.snapshot_serial = None
+        self._revalidation = None
+        self.poller = None
+        self._scene_index = None
+
+    @property
+    def scene_index(self) -> SceneIndex:
+        """Scene membership index, rebuilt after the shades, scenes or
+        scene members have changed."""
+        collections = (self.shades, self.scenes, self.scene_members)
+        if self._scene_index is None or (
+            self._scene_index.versions
+            != SceneIndex.collection_versions(*collections)
+        ):
+            self._scene_index = SceneIndex(*collections)
+        return self._scene_index
+
+    def stale_collections(self, *collections):
+        """Return the names of the collections older than the ttl.
+
+        :param collections: Collection names to check. All when omitted.
+        """
+        return [
+            name
+            for name in collections or self.collections
+            if getattr(self, name).is_stale(self.ttl)
+        ]
+
+    async def _timed_fetch(self, name, quiet=False):
+        """Fetch a collection.
+
+        :return: True when the fetch succeeded."""
+        async with self._semaphore:
+            cache = getattr(self, name)
+            loaded = cache.raw is not None
+            self.changes.pop(name, None)
+            start = time.monotonic()
+            try:
+                changes = await cache.fetch()
+                if loaded and changes is not None:
+                    self.changes[name] = changes
+                return True
+            except PvApiError as err:
+                if quiet:
+                    LOGGER.warning("Problem getting %s: %s", name, err)
+                else:
+                    warn("Problem getting {}: {}".format(name, err))
+                return False
+            finally:
+                self.timings[name] = time.monotonic() - start
+                LOGGER.debug("%s fetched in %.3f s", name, self.timings[name])
+
+    async def update(self, *collections, force=False, quiet=False):
+        """Update the hub cache.
+
+        Only collections older than the ttl are fetched, unless `force`
+        is set. Fetches run concurrently with no more than `concurrency`
+        requests in flight at the same time.
+
+        :param collections: Collection names to update. All when omitted.
+        :param force: Fetch the collections even if they are still fresh.
+        :param quiet: Do not print progress, for use in the background.
+        """
+        if force:
+            collections = collections or self.collections
+        else:
+            collections = self.stale_collections(*collections)
+        if not collections:
+            LOGGER.debug("Hub cache is fresh.")
+            return
+        fetches = asyncio.gather(
+            *(self._timed_fetch(name, quiet) for name in collections)
+        )
+        if quiet:
+            results = await fetches
+        else:
+            with operation("getting hub data"):
+                results = await fetches
+        if any(results):
+            self.save_snapshot()
+        if not quiet:
+            self.print_changes(*collections)
+            if VERBOSE():
+                self.print_timings()
+
+    async def refresh(self, *collections, quiet=False):
+        """Force an update of the hub cache."""
+        await self.update(*collections, force=True, quiet=quiet)
+
+    def print_changes(self, *collections):
+        for name in collections:
+            changes = self.changes.get(name)
+            if changes:
+                print_key_values(name, changes)
+
+    def print_timings(self):
+        for name, duration in sorted(
+            self.timings.items(), key=lambda item: item[1], reverse=True
+        ):
+            print_key_values(name, "{:.3f} s".format(duration))
+
+    def to_snapshot(self) -> dict:
+        """Return the raw data of all cached collections."""
+        collections = {}
+        for name in self.collections:
+            raw = getattr(self, name).raw
+            if raw is not None:
+                collections[name] = raw
+        return {
+            snapshot.KEY_HUB: self.request.hub_ip,
+            snapshot.KEY_SERIAL: self.user_data.serial_number,
+            snapshot.KEY_SAVED: time.time(),
+            snapshot.KEY_COLLECTIONS: collections,
+        }
+
+    def restore(self, data: dict):
+        """Fill the cache from snapshot data.
+
+        Restored collections are considered fresh. Use `revalidate` to
+        bring them up to date with the hub.
+        """
+        for name, raw in data.get(snapshot.KEY_COLLECTIONS, {}).items():
+            if name not in self.collections:
+                continue
+            cache = getattr(self, name)
+            try:
+                cache.load(raw)
+            except (KeyError, TypeError, ValueError) as err:
+                LOGGER.warning(
+                    "Unable to restore %s from snapshot: %s", name, err
+                )
+                continue
+            cache.touch()
+        self.snapshot_saved = data.get(snapshot.KEY_SAVED)
+        self.snapshot_serial = data.get(snapshot.KEY_SERIAL)
+
+    def load_snapshot(self):
+        """Restore the cache from the snapshot file.
+
+        :return: True when a snapshot has been loaded."""
+        if self.snapshot_path is None:
+            return False
+        data = snapshot.load_snapshot(self.snapshot_path)
+        if data is None:
+            return False
+        self.restore(data)
+        return True
+
+    def save_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        try:
+            snapshot.save_snapshot(self.snapshot_path, self.to_snapshot())
+        except OSError as err:
+            LOGGER.warning("Unable to save snapshot: %s", err)
+
+    def discard_snapshot(self):
+        """Forget the collections restored from a snapshot."""
+        for name in self.collections:
+            cache = getattr(self, name)
+            if isinstance(cache, ResourceCache):
+                cache.clear()
+        self.changes = {}
+        self.snapshot_saved = None
+        self.snapshot_serial = None
+
+    def revalidate(self):
+        """Refresh all collections in the background."""
+        if self._revalidation is None or self._revalidation.done():
+            self._revalidation = asyncio.ensure_future(
+                self._revalidate(), loop=self.loop
+            )
+        return self._revalidation
+
+    async def _revalidate(self):
+        collections = self.collections
+        if self.snapshot_serial is not None:
+            # snapshots are stored by address, another hub may have it now.
+            await self._timed_fetch("user_data", quiet=True)
+            if self.user_data.serial_number != self.snapshot_serial:
+                LOGGER.warning(
+                    "Discarding the snapshot of hub %s, %s is another hub.",
+                    self.snapshot_serial,
+                    self.request.hub_ip,
+                )
+                self.discard_snapshot()
+            collections = [
+                _name for _name in collections if _name != "user_data"
+            ]
+        await self.update(*collections, force=True, quiet=True)
+
+    def start_poller(self, **kwargs):
+        """Keep the shades up to date in the background.
+
+        :param kwargs: ShadePoller arguments.
+        """
+        if self.poller is None:
+            self.poller = ShadePoller(self, **kwargs)
+        self.poller.start()
+        return self.poller
+
+    def notify_moved(self, *shade_ids):
+        """Tell the poller shades have been given a command."""
+        if self.poller is not None:
+            self.poller.kick(*shade_ids)
 
-    async def update(self):
-        """Update the hub cache."""
-        await self.shades.get_resource()
-        await self.rooms.get_resource()
-        await self.scenes.get_resource()
-        await self.scene_members.get_resource()
-        await self.user_data.update_user_data()
-        await asyncio.sleep(1)
+    def stop(self):
+        """Cancel running background work."""
+        if self._revalidation is not None:
+            self._revalidation.cancel()
+        if self.poller is not None:
+            self.poller.stop()
@@ -0,0 +1,75 @@
+"""Lookups between scenes, scene members, shades and rooms."""
+
+from aiopvapi.helpers.constants import ATTR_POSITION_DATA
+
+
+class SceneIndex:
+    """Scene membership in both directions.
+
+    Built once from the hub cache collections, after which every lookup
+    is a dict access. `HubCache.scene_index` rebuilds it when one of the
+    collections has changed.
+    """
+
+    def __init__(self, shades, scenes, scene_members):
+        self.shades = shades
+        self.scenes = scenes
+        self.versions = self.collection_versions(shades, scenes, scene_members)
+        self._members_by_scene = {}
+        self._members_by_shade = {}
+        self._positions = {}
+        self._dangling = []
+        for member in scene_members:
+            scene_id, shade_id = member.scene_id, member.shade_id
+            self._members_by_scene.setdefault(scene_id, []).append(member)
+            self._members_by_shade.setdefault(shade_id, []).append(member)
+            self._positions.setdefault(scene_id, {})[shade_id] = (
+                member.raw_data.get(ATTR_POSITION_DATA)
+            )
+            if (
+                shades.get_by_id(shade_id) is None
+                or scenes.get_by_id(scene_id) is None
+            ):
+                self._dangling.append(member)
+
+    @staticmethod
+    def collection_versions(*collections) -> tuple:
+        return tuple(_collection.version for _collection in collections)
+
+    def members(self, scene_id) -> list:
+        """The scene members of a scene."""
+        return list(self._members_by_scene.get(scene_id, ()))
+
+    def positions(self, scene_id) -> dict:
+        """The positions a scene sets, by shade id."""
+        return dict(self._positions.get(scene_id, {}))
+
+    def position(self, scene_id, shade_id):
+        """The position a scene sets a shade to. None when not a member."""
+        return self._positions.get(scene_id, {}).get(shade_id)
+
+    def shades_in_scene(self, scene_id) -> list:
+        """The shades of a scene. Members of unknown shades are skipped."""
+        shades = (
+            self.shades.get_by_id(_member.shade_id)
+            for _member in self._members_by_scene.get(scene_id, ())
+        )
+        return [_shade for _shade in shades if _shade is not None]
+
+    def scenes_with_shade(self, shade_id) -> list:
+        """The scenes containing a shade."""
+        scenes = (
+            self.scenes.get_by_id(_member.scene_id)
+            for _member in self._members_by_shade.get(shade_id, ())
+        )
+        return [_scene for _scene in scenes if _scene is not None]
+
+    def shades_in_room(self, room_id) -> list:
+        return self.shades.find_by_room_id(room_id)
+
+    def scenes_in_room(self, room_id) -> list:
+        return self.scenes.find_by_room_id(room_id)
+
+    def dangling_members(self) -> list:
+        """Scene members referring to a shade or scene which does not exist."""
+        return list(self._dangling)
@@ -1,12 +1,12 @@
 import logging
 
 from aiopvapi.helpers.aiorequest import PvApiError
-from aiopvapi.helpers.constants import ATTR_ROOM_ID
 from aiopvapi.resources.scene import Scene as PvScene
 from aiopvapi.scene_members import SceneMembers
 
 
 # from pv_prompt.glob import VERBOSE
+from pv_prompt.bulk import activate_scenes, parse_ids
 from pv_prompt.base_prompts import (
     PvPrompt,
     Command,
@@ -17,19 +17,26 @@ from pv_prompt.base_prompts import (
 from pv_prompt.helpers import VERBOSE
 from pv_prompt.print_output import (
     info,
-    print_scenes,
     warn,
     print_resource_data,
     print_table,
     print_shade_data,
     print_dict,
+    print_bulk_results,
+    print_paged,
+    print_raw,
+    print_scene_members,
+    scene_table,
 )
+from pv_prompt.progress import operation
 from pv_prompt.resource_cache import HubCache
 
 LOGGER = logging.getLogger(__name__)
 
 
 class Scenes(PvPrompt):
+    collections = ("scenes", "rooms")
+
     def __init__(self, request, hub_cache: HubCache):
         super().__init__(request, hub_cache)
         self.api_resource = hub_cache.scenes
@@ -39,13 +46,19 @@ class Scenes(PvPrompt):
                 "a": Command(function_=self.activate_scene),
                 "s": Command(function_=self.select_scene),
                 "c": Command(function_=self.create_scene),
+                "u": Command(
+                    function_=self.activate_scenes, label="b(u)lk activate"
+                ),
             }
         )
 
     async def list_scenes(self, *args, **kwargs):
         info("Getting scenes...")
-
-        print_scenes(self.hub_cache.scenes, self.hub_cache.rooms)
+        await self.hub_cache.update(*self.collections)
+        print_raw(self.hub_cache.scenes)
+        await print_paged(
+            scene_table(self.hub_cache.scenes, self.hub_cache.rooms)
+        )
 
     async def activate_scene(self, *args, **kwargs):
         try:
@@ -58,6 +71,26 @@ class Scenes(PvPrompt):
         except PvApiError as err:
             warn(err)
 
+    async def activate_scenes(self, *args, **kwargs):
+        """Activate a list of scenes at once."""
+        base = BasePrompt()
+        try:
+            ids = parse_ids(
+                await base.current_prompt(
+                    "Scene ids: ",
+                    toolbar="Enter scene ids, i.e. 12,34,56",
+                    autoreturn=True,
+                    autocomplete=self.hub_cache.scenes.id_suggestions,
+                )
+            )
+            _scenes = [self.hub_cache.scenes.find_by_id(_id) for _id in ids]
+        except InvalidIdException as err:
+            warn(err)
+            return
+        with operation("Activating scenes", total=len(_scenes)) as progress:
+            results = await activate_scenes(_scenes, progress=progress)
+        print_bulk_results(results)
+
     async def select_scene(self, *args, **kwargs):
         try:
             pv_scene = await self.hub_cache.scenes.select_resource()
@@ -141,7 +174,9 @@ class Scene(PvResourcePrompt):
             {
                 "a": Command(function_=self.add_shade_to_scene),
                 "l": Command(function_=self.list_available_shades),
-                # "m": Command(function_=self.show_members)
+                "m": Command(
+                    function_=self.show_members, label="show (m)embers"
+                ),
             }
         )
 
@@ -159,12 +194,17 @@ class Scene(PvResourcePrompt):
     async def list_available_shades(self, *args, **kwargs):
         room_id = self.pv_resource.room_id
         LOGGER.debug("room id: %s", room_id)
-
-        def filter(item):
-            if item._raw_data.get(ATTR_ROOM_ID) == room_id:
-                LOGGER.debug("Match")
-                return True
-            LOGGER.debug("No match")
-            return False
-
-        print_shade_data(self.hub_cache.shades.list_resources(filter=filter))
+        print_shade_data(self.hub_cache.scene_index.shades_in_room(room_id))
+
+    async def show_members(self, *args, **kwargs):
+        await self.hub_cache.update("shades", "scene_members")
+        index = self.hub_cache.scene_index
+        positions = index.positions(self.pv_resource.id)
+        print_scene_members(
+            (
+                self.hub_cache.shades.get_name_by_id(_shade_id) or "unknown",
+                _shade_id,
+                _positions,
+            )
+            for _shade_id, _positions in positions.items()
+        )
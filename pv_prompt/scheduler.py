@@ -0,0 +1,293 @@
+"""Schedules all requests sent to a hub.
+
+Requests are started in order of priority, limited by a token bucket
+and a maximum number of requests in flight. User commands overtake
+cache refreshes, background polling goes last and queued moves of the
+same shade are collapsed to the newest target.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+import aiohttp
+from aiopvapi.helpers.aiorequest import AioRequest, PvApiConnectionError
+from aiopvapi.helpers.constants import (
+    ATTR_SCENE_ID,
+    ATTR_SHADE,
+    ATTR_POSITION_DATA,
+)
+
+from pv_prompt.stats import RequestStats, measure_transfer, transfer_trace
+
+LOGGER = logging.getLogger(__name__)
+
+# Shade moves and stops, scene activations and other changes.
+PRIORITY_INTERACTIVE = 0
+# Queries for a single resource, like a shade refresh.
+PRIORITY_NORMAL = 1
+# Collection queries, like cache refreshes.
+PRIORITY_BULK = 2
+# Requests nobody waits for, like the shade poller.
+PRIORITY_BACKGROUND = 3
+
+# Requests started per second.
+DEFAULT_RATE = 10
+# Requests which may be started at once after an idle period.
+DEFAULT_BURST = 5
+# Maximum number of requests waiting for a hub response.
+DEFAULT_MAX_IN_FLIGHT = 4
+# Times a GET is repeated after a connection error.
+DEFAULT_RETRIES = 1
+
+
+_PRIORITY = contextvars.ContextVar("priority", default=None)
+
+
+@contextmanager
+def request_priority(priority):
+    """Send the requests made in the with block at this priority."""
+    token = _PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def background():
+    """Send the requests made in the with block at background priority."""
+    return request_priority(PRIORITY_BACKGROUND)
+
+
+class TokenBucket:
+    """Token bucket rate limiter."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._last) * self.rate
+        )
+        self._last = now
+
+    async def acquire(self):
+        """Wait for a token."""
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _Job:
+    def __init__(self, priority, method, url, kwargs):
+        self.priority = priority
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.futures = []
+
+    @property
+    def wanted(self):
+        return any(not future.done() for future in self.futures)
+
+    def set_result(self, result):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
+
+    def set_exception(self, exc):
+        for future in self.futures:
+            if not future.done():
+                future.set_exception(exc)
+
+
+def is_move(method, data):
+    """True when a request moves a shade to a position."""
+    try:
+        return method == "put" and ATTR_POSITION_DATA in data[ATTR_SHADE]
+    except (KeyError, TypeError):
+        return False
+
+
+class ScheduledRequest(AioRequest):
+    """AioRequest sending its requests through a priority queue."""
+
+    def __init__(
+        self,
+        hub_ip,
+        loop=None,
+        websession=None,
+        timeout=15,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        retries=DEFAULT_RETRIES,
+    ):
+        if websession is None:
+            websession = aiohttp.ClientSession(
+                trace_configs=[transfer_trace()]
+            )
+        super().__init__(
+            hub_ip, loop=loop, websession=websession, timeout=timeout
+        )
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.stats = RequestStats(hub_ip)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._queued_moves = {}
+        self._in_flight = None
+        self._wakeup = None
+        self._dispatcher = None
+
+    async def get(self, url, params=None):
+        if params and ATTR_SCENE_ID in params:
+            priority = PRIORITY_INTERACTIVE
+        elif params:
+            priority = PRIORITY_NORMAL
+        else:
+            priority = PRIORITY_BULK
+        return await self.submit(priority, "get", url, params=params)
+
+    async def post(self, url, data=None):
+        return await self.submit(PRIORITY_INTERACTIVE, "post", url, data=data)
+
+    async def put(self, url, data=None):
+        return await self.submit(PRIORITY_INTERACTIVE, "put", url, data=data)
+
+    async def delete(self, url, params=None):
+        return await self.submit(
+            PRIORITY_INTERACTIVE, "delete", url, params=params
+        )
+
+    @property
+    def queued(self):
+        return len(self._queue)
+
+    def _start(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.ensure_future(
+                self._dispatch(), loop=self.loop
+            )
+
+    async def submit(self, priority, method, url, **kwargs):
+        """Queue a request and wait for its response."""
+        if _PRIORITY.get() is not None:
+            priority = _PRIORITY.get()
+        self._start()
+        future = self.loop.create_future()
+        move = is_move(method, kwargs.get("data"))
+        job = self._queued_moves.get(url)
+        if job is not None and move:
+            LOGGER.debug("Collapsing move of %s to the newest target.", url)
+            job.kwargs = kwargs
+            job.futures.append(future)
+            return await future
+        job = _Job(priority, method, url, kwargs)
+        job.futures.append(future)
+        if move:
+            self._queued_moves[url] = job
+        else:
+            # a later move must not overtake this request, like a stop.
+            self._queued_moves.pop(url, None)
+        heapq.heappush(self._queue, (priority, next(self._sequence), job))
+        self._wakeup.set()
+        return await future
+
+    async def _dispatch(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._in_flight.acquire()
+            await self.bucket.acquire()
+            # popped only now so requests queued in the meantime with a
+            # higher priority go first.
+            _, _, job = heapq.heappop(self._queue)
+            if self._queued_moves.get(job.url) is job:
+                del self._queued_moves[job.url]
+            if not job.wanted:
+                self._in_flight.release()
+                continue
+            asyncio.ensure_future(self._execute(job), loop=self.loop)
+
+    async def _execute(self, job):
+        try:
+            result = await self._send_recorded(
+                job.method, job.url, **job.kwargs
+            )
+        except Exception as err:
+            job.set_exception(err)
+        else:
+            job.set_result(result)
+        finally:
+            self._in_flight.release()
+
+    async def _send_recorded(self, method, url, **kwargs):
+        """Send a request, recording its statistics.
+
+        GET requests are idempotent and repeated after a connection error."""
+        params = kwargs.get("params")
+        attempt = 0
+        while True:
+            transfer = measure_transfer()
+            start = time.monotonic()
+            try:
+                result = await self._send(method, url, **kwargs)
+            except Exception as err:
+                self.stats.record(
+                    method,
+                    url,
+                    params,
+                    time.monotonic() - start,
+                    err,
+                    transfer.sent,
+                )
+                if (
+                    method == "get"
+                    and isinstance(err, PvApiConnectionError)
+                    and attempt < self.retries
+                ):
+                    attempt += 1
+                    self.stats.retry(method, url, params)
+                    LOGGER.debug("Retrying %s, attempt %s.", url, attempt)
+                    continue
+                raise
+            self.stats.record(
+                method,
+                url,
+                params,
+                time.monotonic() - start,
+                sent=transfer.sent,
+                received=transfer.received,
+            )
+            return result
+
+    async def _send(self, method, url, **kwargs):
+        return await getattr(super(), method)(url, **kwargs)
+
+    def stop(self):
+        """Stop dispatching. Queued requests are cancelled."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for _, _, job in self._queue:
+            for future in job.futures:
+                future.cancel()
+        self._queue = []
+        self._queued_moves = {}
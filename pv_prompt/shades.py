@@ -10,6 +10,7 @@ from aiopvapi.helpers.constants import (
 from aiopvapi.resources.shade import BaseShade, ShadeBottomUpTiltAnywhere, MAX_POSITION
 from prompt_toolkit.completion import WordCompleter
 
+from pv_prompt import bulk
 from pv_prompt.base_prompts import (
     PvResourcePrompt,
     Command,
@@ -17,14 +18,20 @@ from pv_prompt.base_prompts import (
     InvalidIdException,
     ListPrompt,
     NumberPrompt,
+    BasePrompt,
 )
 from pv_prompt.print_output import (
     info,
     print_shade_data,
     warn,
     print_key_values,
-    print_waiting_done,
+    print_bulk_results,
+    print_paged,
+    print_raw,
+    print_shade_scenes,
+    shade_table,
 )
+from pv_prompt.progress import operation
 from pv_prompt.resource_cache import HubCache
 
 LOGGER = logging.getLogger(__name__)
@@ -41,6 +48,7 @@ class Shade(PvResourcePrompt):
                 "r": Command(function_=self.refresh),
                 "s": Command(function_=self.stop),
                 "m": Command(function_=self.move),
+                "e": Command(function_=self.scenes, label="sc(e)nes"),
             }
         )
         if shade.can_move:
@@ -62,30 +70,49 @@ class Shade(PvResourcePrompt):
     async def refresh(self, *args, **kwargs):
         await self.pv_resource.refresh()
 
+    async def scenes(self, *args, **kwargs):
+        """List the scenes this shade is a member of."""
+        await self.hub_cache.update("scenes", "rooms", "scene_members")
+        index = self.hub_cache.scene_index
+        print_shade_scenes(
+            (
+                _scene.name,
+                _scene.id,
+                index.position(_scene.id, self.pv_resource.id),
+            )
+            for _scene in index.scenes_with_shade(self.pv_resource.id)
+        )
+
     async def jog(self, *args, **kwargs):
         await self.pv_resource.jog()
+        self.hub_cache.notify_moved(self.pv_resource.id)
 
     async def open(self, *args, **kwargs):
-        done = print_waiting_done("Opening")
-        await self.pv_resource.open()
-        await done()
+        with operation("Opening"):
+            await self.pv_resource.open()
+        self.hub_cache.notify_moved(self.pv_resource.id)
 
     async def close(self, *args, **kwargs):
-        done = print_waiting_done("Closing")
-        await self.pv_resource.close()
-        await done()
+        with operation("Closing"):
+            await self.pv_resource.close()
+        self.hub_cache.notify_moved(self.pv_resource.id)
 
     async def tilt_close(self, *args, **kwargs):
         await self.pv_resource.tilt_close()
+        self.hub_cache.notify_moved(self.pv_resource.id)
 
     async def tilt_open(self, *args, **kwargs):
         await self.pv_resource.tilt_open()
+        self.hub_cache.notify_moved(self.pv_resource.id)
 
     async def stop(self, *args, **kwargs):
         await self.pv_resource.stop()
+        self.hub_cache.notify_moved(self.pv_resource.id)
 
 
 class Shades(PvPrompt):
+    collections = ("shades",)
+
     def __init__(self, request, hub_cache: HubCache):
         super().__init__(request, hub_cache)
         # self._shades_resource = PvShades(request)
@@ -94,14 +121,15 @@ class Shades(PvPrompt):
             {
                 "l": Command(function_=self._list_shades),
                 "s": Command(function_=self._select_shade),
+                "u": Command(function_=self._bulk, label="b(u)lk"),
             }
         )
         self._prompt = "Shades: "
 
     async def _list_shades(self, *args, **kwargs):
-        await self.hub_cache.shades.get_resource()
-        info("")  # print a newline
-        print_shade_data(self.hub_cache.shades)
+        await self.hub_cache.update(*self.collections)
+        print_raw(self.hub_cache.shades)
+        await print_paged(shade_table(self.hub_cache.shades))
 
     async def _select_shade(self, *args, **kwargs):
         try:
@@ -111,6 +139,121 @@ class Shades(PvPrompt):
         except InvalidIdException as err:
             warn(err)
 
+    async def _bulk(self, *args, **kwargs):
+        bulk_shades = BulkShades(self.request, self.hub_cache)
+        await bulk_shades.current_prompt()
+
+
+class BulkShades(PvPrompt):
+    """Act on a selection of shades at once."""
+
+    collections = ("shades",)
+
+    def __init__(self, request, hub_cache: HubCache):
+        super().__init__(request, hub_cache)
+        self.register_commands(
+            {
+                "i": Command(function_=self.select_ids, label="select (i)ds"),
+                "m": Command(
+                    function_=self.select_room, label="select roo(m)"
+                ),
+                "t": Command(
+                    function_=self.select_type, label="select (t)ype"
+                ),
+                "a": Command(function_=self.select_all, label="select (a)ll"),
+                "l": Command(function_=self.list_selection, label="(l)ist"),
+                "o": Command(function_=self.open),
+                "c": Command(function_=self.close),
+                "s": Command(function_=self.stop),
+                "p": Command(function_=self.move, label="move to (p)osition"),
+            }
+        )
+        self._prompt = "Bulk shades: "
+        self.selection = []
+
+    def _select(self, **kwargs):
+        try:
+            self.selection = bulk.select_shades(
+                self.hub_cache.shades, **kwargs
+            )
+        except InvalidIdException as err:
+            warn(err)
+            return
+        info("{} shades selected.".format(len(self.selection)))
+
+    async def _enter(self, prompt_, toolbar):
+        base = BasePrompt()
+        return await base.current_prompt(
+            prompt_, toolbar=toolbar, autoreturn=True
+        )
+
+    async def select_ids(self, *args, **kwargs):
+        try:
+            ids = bulk.parse_ids(
+                await self._enter(
+                    "Shade ids: ", "Enter shade ids, i.e. 12,34,56"
+                )
+            )
+        except InvalidIdException as err:
+            warn(err)
+            return
+        self._select(ids=ids)
+
+    async def select_room(self, *args, **kwargs):
+        try:
+            room = await self.hub_cache.rooms.select_resource()
+        except InvalidIdException as err:
+            warn(err)
+            return
+        self._select(room_id=room.id)
+
+    async def select_type(self, *args, **kwargs):
+        shade_type = await self._enter(
+            "Shade type: ", "Enter a shade type number"
+        )
+        try:
+            self._select(shade_type=int(shade_type))
+        except (TypeError, ValueError):
+            warn("Incorrect shade type.")
+
+    async def select_all(self, *args, **kwargs):
+        self._select()
+
+    async def list_selection(self, *args, **kwargs):
+        print_shade_data(self.selection)
+
+    async def _run(self, name, bulk_operation, *args):
+        if not self.selection:
+            warn("No shades selected.")
+            return
+        with operation(name, total=len(self.selection)) as progress:
+            results = await bulk_operation(
+                self.selection, *args, progress=progress
+            )
+        print_bulk_results(results)
+        self.hub_cache.notify_moved(*(shade.id for shade in self.selection))
+
+    async def open(self, *args, **kwargs):
+        await self._run("Opening shades", bulk.open_shades)
+
+    async def close(self, *args, **kwargs):
+        await self._run("Closing shades", bulk.close_shades)
+
+    async def stop(self, *args, **kwargs):
+        await self._run("Stopping shades", bulk.stop_shades)
+
+    async def move(self, *args, **kwargs):
+        position = await self._enter(
+            "Enter a position1: ",
+            "0 (closed) to {} (open)".format(MAX_POSITION),
+        )
+        try:
+            position_data = bulk.primary_position(position)
+        except (TypeError, ValueError):
+            warn("Incorrect position.")
+            return
+        await self._run("Moving shades", bulk.move_shades, position_data)
+
 
 class Position(PvPrompt):
     """Define a position object for the shade to move too."""
@@ -176,3 +319,4 @@ class Position(PvPrompt):
         await self.put_values()
         print_key_values("moving to:", self._position[ATTR_POSITION])
         await self._shade.move(self._position[ATTR_POSITION])
+        self.hub_cache.notify_moved(self._shade.id)
@@ -0,0 +1,83 @@
+"""On disk snapshots of the hub cache."""
+
+import json
+import logging
+import os
+import re
+import tempfile
+
+LOGGER = logging.getLogger(__name__)
+
+# Bump when the layout of the snapshot changes. Snapshots with another
+# version are ignored.
+SNAPSHOT_VERSION = 1
+
+KEY_VERSION = "version"
+KEY_HUB = "hub"
+KEY_SERIAL = "serial"
+KEY_SAVED = "saved"
+KEY_COLLECTIONS = "collections"
+
+
+def default_cache_dir():
+    """Return the folder the hub snapshots are stored in."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "pv_prompt")
+
+
+def hub_key(hub_ip):
+    """Convert a hub address to a string usable as a file name."""
+    address = hub_ip.split("://")[-1].strip("/")
+    return re.sub(r"[^0-9A-Za-z.-]", "_", address)
+
+
+def snapshot_path(hub_ip, cache_dir=None):
+    return os.path.join(
+        cache_dir or default_cache_dir(), "hub_{}.json".format(hub_key(hub_ip))
+    )
+
+
+def save_snapshot(path, snapshot: dict):
+    """Write a snapshot.
+
+    The snapshot is written to a temporary file first and moved in place
+    so an interrupted write never leaves a corrupt snapshot behind."""
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    snapshot = dict(snapshot)
+    snapshot[KEY_VERSION] = SNAPSHOT_VERSION
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fl:
+            json.dump(snapshot, fl, separators=(",", ":"))
+        os.replace(tmp, path)
+    except Exception:
+        os.remove(tmp)
+        raise
+    LOGGER.debug("Snapshot saved to %s", path)
+
+
+def load_snapshot(path):
+    """Read a snapshot.
+
+    :return: The snapshot or None when it is missing, unreadable or of
+        another version.
+    """
+    try:
+        with open(path) as fl:
+            snapshot = json.load(fl)
+    except FileNotFoundError:
+        LOGGER.debug("No snapshot found at %s", path)
+        return None
+    except (OSError, ValueError) as err:
+        LOGGER.warning("Unable to read snapshot %s: %s", path, err)
+        return None
+    if (
+        not isinstance(snapshot, dict)
+        or snapshot.get(KEY_VERSION) != SNAPSHOT_VERSION
+    ):
+        LOGGER.info("Ignoring snapshot %s with an unknown version.", path)
+        return None
+    return snapshot
@@ -0,0 +1,213 @@
+"""Request statistics of the hub request layer.
+
+Every request is recorded per endpoint: a latency histogram, the number
+of errors and retries and the number of bytes sent and received.
+"""
+
+import contextvars
+import math
+import re
+import time
+from collections import OrderedDict
+
+import aiohttp
+
+# Relative width of the latency buckets. Percentiles are accurate to
+# within this factor.
+BUCKET_RATIO = 1.1
+# Latencies below this number of seconds end up in the first bucket.
+MIN_LATENCY = 0.0001
+
+PERCENTILES = (50, 95, 99)
+
+_ID_IN_PATH = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_name(method, url, params=None) -> str:
+    """Group requests by endpoint, like GET /api/shades/{id}."""
+    path = "/" + url.split("://")[-1].split("/", 1)[-1]
+    name = "{} {}".format(method.upper(), _ID_IN_PATH.sub("/{id}", path))
+    if params:
+        name += "?" + ",".join(sorted(params))
+    return name
+
+
+class Transfer:
+    """Body bytes sent and received by one request."""
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+
+
+_TRANSFER = contextvars.ContextVar("transfer", default=None)
+
+
+def measure_transfer() -> Transfer:
+    """Count the body bytes of the next request sent from this task.
+
+    Only sessions created with a `transfer_trace` count them."""
+    transfer = Transfer()
+    _TRANSFER.set(transfer)
+    return transfer
+
+
+async def _on_request_chunk_sent(session, context, params):
+    transfer = _TRANSFER.get()
+    if transfer is not None:
+        transfer.sent += len(params.chunk)
+
+
+async def _on_response_chunk_received(session, context, params):
+    transfer = _TRANSFER.get()
+    if transfer is not None:
+        transfer.received += len(params.chunk)
+
+
+def transfer_trace() -> aiohttp.TraceConfig:
+    """Trace config counting the body bytes as they go over the wire."""
+    trace = aiohttp.TraceConfig()
+    trace.on_request_chunk_sent.append(_on_request_chunk_sent)
+    trace.on_response_chunk_received.append(_on_response_chunk_received)
+    return trace
+
+
+class LatencyHistogram:
+    """Histogram with logarithmic buckets.
+
+    Recording is O(1) and the memory used does not grow with the number
+    of samples."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _bucket(seconds):
+        return math.ceil(
+            math.log(max(seconds, MIN_LATENCY) / MIN_LATENCY, BUCKET_RATIO)
+        )
+
+    def record(self, seconds):
+        bucket = self._bucket(seconds)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, percentile):
+        """Upper bound of the bucket holding the percentile, in seconds."""
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * percentile / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(MIN_LATENCY * BUCKET_RATIO**bucket, self.max)
+        return self.max
+
+
+class EndpointStats:
+    """Statistics of a single endpoint."""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = {}
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def requests(self):
+        return self.latency.count
+
+    @property
+    def error_count(self):
+        return sum(self.errors.values())
+
+    def to_dict(self) -> dict:
+        data = OrderedDict(
+            [
+                ("requests", self.requests),
+                ("errors", dict(self.errors)),
+                ("retries", self.retries),
+                ("bytes_sent", self.bytes_sent),
+                ("bytes_received", self.bytes_received),
+                ("mean", self.latency.mean),
+                ("max", self.latency.max),
+            ]
+        )
+        for _percentile in PERCENTILES:
+            data["p{}".format(_percentile)] = self.latency.percentile(
+                _percentile
+            )
+        return data
+
+
+class RequestStats:
+    """Statistics of all requests sent to one hub."""
+
+    def __init__(self, hub_ip=None):
+        self.hub_ip = hub_ip
+        self.started = time.time()
+        self.endpoints = {}
+
+    def __iter__(self):
+        return iter(sorted(self.endpoints.items()))
+
+    def endpoint(self, method, url, params=None) -> EndpointStats:
+        name = endpoint_name(method, url, params)
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints[name] = EndpointStats()
+        return stats
+
+    def record(
+        self,
+        method,
+        url,
+        params=None,
+        duration=0.0,
+        error=None,
+        sent=0,
+        received=0,
+    ):
+        stats = self.endpoint(method, url, params)
+        stats.latency.record(duration)
+        stats.bytes_sent += sent
+        stats.bytes_received += received
+        if error is not None:
+            name = error.__class__.__name__
+            stats.errors[name] = stats.errors.get(name, 0) + 1
+
+    def retry(self, method, url, params=None):
+        self.endpoint(method, url, params).retries += 1
+
+    def reset(self):
+        self.started = time.time()
+        self.endpoints = {}
+
+    def to_dict(self) -> dict:
+        return OrderedDict(
+            [
+                ("hub", self.hub_ip),
+                ("started", self.started),
+                (
+                    "endpoints",
+                    OrderedDict(
+                        (_name, _stats.to_dict()) for _name, _stats in self
+                    ),
+                ),
+            ]
+        )
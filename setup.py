@@ -17,16 +17,15 @@ DESCRIPTION = "PowerView shades toolkit"
 URL = "https://github.com/sander76/pv_prompt"
 EMAIL = None
 AUTHOR = "Sander Teunissen"
-REQUIRES_PYTHON = ">=3.5.0"
+REQUIRES_PYTHON = ">=3.7.0"
 VERSION = "1.10.0"
 
 # What packages are required for this module to be executed?
 REQUIRED = [
     "prompt_toolkit",
-    "aiopvapi>1.6.14",
+    "aiopvapi>1.6.14,<1.7",
     "pysmb",
     "asyncdns2",
-    "pygments",
     "pyserial",
 ]
 
@@ -124,8 +123,7 @@ setup(
         # Full list: https://pypi.python.org/pypi?%3Aaction=list_classifiers
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: Implementation :: CPython",
         "Programming Language :: Python :: Implementation :: PyPy",
     ],
@@ -0,0 +1,162 @@
+"""Fixtures shared by the tests."""
+
+import asyncio
+import copy
+import os
+
+import pytest
+
+from pv_prompt.dongle.codec import FrameDecoder
+from pv_prompt.dongle.dongle import NordicSerial
+
+HUB_DATA = {
+    "api/shades": {
+        "shadeIds": [1, 2],
+        "shadeData": [
+            {"id": 1, "name": "U2hhZGUgMQ==", "roomId": 10, "type": 6},
+            {"id": 2, "name": "U2hhZGUgMg==", "roomId": 11, "type": 6},
+        ],
+    },
+    "api/rooms": {
+        "roomIds": [10, 11],
+        "roomData": [
+            {"id": 10, "name": "Um9vbSAx"},
+            {"id": 11, "name": "Um9vbSAy"},
+        ],
+    },
+    "api/scenes": {
+        "sceneIds": [20],
+        "sceneData": [
+            {
+                "id": 20,
+                "name": "U2NlbmUgMQ==",
+                "roomId": 10,
+                "networkNumber": 1,
+            }
+        ],
+    },
+    "api/scenemembers": {
+        "sceneMemberData": [
+            {"id": 30, "sceneId": 20, "shadeId": 1, "positions": {}}
+        ]
+    },
+    "api/userdata": {"userData": {"hubName": "SHVi", "ip": "1.2.3.4"}},
+}
+
+
+class FakeRequest:
+    """Stand in for AioRequest serving canned hub data."""
+
+    def __init__(self, delay=0.01):
+        self.hub_ip = "1.2.3.4"
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.urls = []
+        self.positions = {}
+
+    async def get(self, url, params=None):
+        self.urls.append(url)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        path = url.split("1.2.3.4/")[-1]
+        if path.startswith("api/shades/"):
+            _id = int(path.split("/")[-1])
+            for shade in HUB_DATA["api/shades"]["shadeData"]:
+                if shade["id"] == _id:
+                    return {
+                        "shade": dict(shade, positions=self.positions.get(_id))
+                    }
+        return HUB_DATA[path]
+
+
+class FakeDongle:
+    """The other end of a pseudo terminal, answering every frame."""
+
+    def __init__(self, loop, answer=lambda frame: frame, chunk=None):
+        self.loop = loop
+        self.master, slave = os.openpty()
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self._decoder = FrameDecoder()
+        self.answer = answer
+        self.chunk = chunk
+        self.received = []
+        loop.add_reader(self.master, self._read)
+
+    def _read(self):
+        for frame in self._decoder.feed(os.read(self.master, 1024)):
+            self.received.append(frame)
+            self.send(self.answer(frame))
+
+    def send(self, data):
+        if not self.chunk:
+            os.write(self.master, data)
+            return
+        for idx in range(0, len(data), self.chunk):
+            self.loop.call_later(
+                0.01 * idx, os.write, self.master, data[idx : idx + self.chunk]
+            )
+
+    def close(self):
+        self.loop.remove_reader(self.master)
+        os.close(self.master)
+        os.close(self._slave)
+
+
+@pytest.fixture
+def loop():
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    yield _loop
+    _loop.close()
+
+
+@pytest.fixture
+def fake_request():
+    return FakeRequest()
+
+
+@pytest.fixture
+def hub_data():
+    return copy.deepcopy(HUB_DATA)
+
+
+@pytest.fixture
+def fake_dongle(loop):
+    """Create fake dongles, closed after the test."""
+    dongles = []
+
+    def _fake_dongle(**kwargs):
+        dongle = FakeDongle(loop, **kwargs)
+        dongles.append(dongle)
+        return dongle
+
+    yield _fake_dongle
+    for dongle in dongles:
+        dongle.close()
+
+
+@pytest.fixture
+def nordic_serial(loop, fake_dongle):
+    """Create a NordicSerial connected to a fake dongle, closed after the
+    test."""
+    nordics = []
+
+    def _nordic_serial(dongle, **kwargs):
+        nordic = NordicSerial(loop, dongle.port, frame_spacing=0, **kwargs)
+        nordics.append(nordic)
+
+        async def _connected():
+            while not nordic.connected:
+                await asyncio.sleep(0.01)
+
+        loop.run_until_complete(_connected())
+        return nordic
+
+    yield _nordic_serial
+    for nordic in nordics:
+        nordic.close()
+    loop.run_until_complete(asyncio.sleep(0))
@@ -1,17 +1,48 @@
 import pytest
 
-from pv_prompt.base_prompts import BasePrompt
+from pv_prompt import async_prompt, base_prompts
+from pv_prompt.base_prompts import BasePrompt, Command
+from pv_prompt.resource_cache import HubCache
+from pv_prompt.scenes import Scenes
+from pv_prompt.shades import Shades
 
 
 def another_method():
     pass
 
 
-def test_toolbar_string():
-    ts = BasePrompt('', 1, 2)
+def test_toolbar_string(loop):
+    ts = BasePrompt()
     _str = ts._toolbar_string()
-    assert _str == "(q) quit"
+    assert _str == "(q) (q)uit | (b) back"
 
-    ts.register_commands({'a': another_method})
+    ts.register_commands({"a": Command(function_=another_method)})
     _str = ts._toolbar_string()
-    assert _str == "(q) quit | (a) another_method"
+    assert _str == "(q) (q)uit | (b) back | (a) another_method"
+
+
+@pytest.mark.parametrize("menu", [Shades, Scenes])
+def test_b_goes_back(loop, fake_request, monkeypatch, menu):
+    entered = []
+
+    async def _prompt(*args, **kwargs):
+        assert not entered, "b did not leave the menu"
+        entered.append("b")
+        return "b"
+
+    monkeypatch.setattr(base_prompts, "prompt", _prompt)
+    prompt = menu(fake_request, HubCache(fake_request, loop))
+    assert loop.run_until_complete(prompt.current_prompt()) is None
+    assert entered == ["b"]
+
+
+def test_export_stats_to_a_bad_path(loop, monkeypatch, tmp_path):
+    warnings = []
+
+    async def _prompt(*args, **kwargs):
+        return str(tmp_path / "missing" / "stats.json")
+
+    monkeypatch.setattr(base_prompts, "prompt", _prompt)
+    monkeypatch.setattr(async_prompt, "warn", warnings.append)
+    loop.run_until_complete(async_prompt.MainMenu(loop)._export_stats())
+    assert warnings[0].startswith("Unable to write request statistics")
@@ -0,0 +1,58 @@
+import io
+import json
+
+from benchmarks.fake_hub import FakeHub
+from pv_prompt.batch import BatchRunner, run_batch
+from pv_prompt.resource_cache import HubCache
+
+
+def run_script(loop, fake_request, script):
+    output = io.StringIO()
+    hub_cache = HubCache(fake_request, loop)
+    loop.run_until_complete(hub_cache.update(quiet=True))
+    failed = loop.run_until_complete(
+        BatchRunner(hub_cache, output).run(script.splitlines())
+    )
+    return failed, [
+        json.loads(line) for line in output.getvalue().splitlines()
+    ]
+
+
+def test_batch_commands(loop, fake_request):
+    failed, results = run_script(
+        loop,
+        fake_request,
+        """
+        # a comment
+        shades list room 11
+        rooms list
+        shade 99 open
+        shades dance
+        """,
+    )
+    assert failed == 2
+    assert [result["ok"] for result in results] == [True, True, False, False]
+    assert results[0]["result"][0]["id"] == 2
+    assert results[1]["result"] == [
+        {"id": 10, "name": "Room 1"},
+        {"id": 11, "name": "Room 2"},
+    ]
+    assert results[3]["error"] == "Unknown shades action: dance"
+
+
+def test_run_batch(loop, tmp_path, capsys):
+    hub = FakeHub(shades=2)
+    address = loop.run_until_complete(hub.start())
+    script = tmp_path / "script"
+    script.write_text("rooms list\nshade 1 move 0 65535\n")
+    try:
+        failed = run_batch(loop, address, str(script))
+    finally:
+        loop.run_until_complete(hub.stop())
+
+    results = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+    assert failed == 0
+    assert results[0]["result"] == [{"id": 1000, "name": "Room 0"}]
+    assert results[1]["ok"]
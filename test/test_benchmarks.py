@@ -0,0 +1,26 @@
+import json
+
+from benchmarks import run
+
+
+def test_benchmarks_run_and_compare(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    assert (
+        run.main(["--scales", "10", "--repeat", "1", "--save", str(baseline)])
+        == 0
+    )
+
+    results = json.loads(baseline.read_text())
+    assert set(results) == set(run.BENCHMARKS)
+    assert all(results[name]["10"] > 0 for name in results)
+
+    slower = {"find_by_id": {"10": results["find_by_id"]["10"] * 2}}
+    assert run.compare(slower, results) == [
+        (
+            "find_by_id",
+            "10",
+            slower["find_by_id"]["10"],
+            results["find_by_id"]["10"],
+            2,
+        )
+    ]
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from aiopvapi.helpers.aiorequest import PvApiConnectionError
+
+from pv_prompt.base_prompts import InvalidIdException
+from pv_prompt.bulk import parse_ids, run_bulk
+
+
+class FakeResource:
+    def __init__(self, id_):
+        self.id = id_
+        self.name = "resource {}".format(id_)
+
+
+def test_parse_ids():
+    assert parse_ids("1, 2 3") == [1, 2, 3]
+    with pytest.raises(InvalidIdException):
+        parse_ids("1,a")
+
+
+def test_run_bulk_reports_every_item():
+    loop = asyncio.new_event_loop()
+    in_flight = []
+    max_in_flight = []
+
+    async def action(resource):
+        in_flight.append(resource)
+        max_in_flight.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(resource)
+        if resource.id == 3:
+            raise PvApiConnectionError("timeout")
+
+    results = loop.run_until_complete(
+        run_bulk(
+            [FakeResource(_id) for _id in range(6)], action, concurrency=2
+        )
+    )
+    loop.close()
+
+    assert max(max_in_flight) == 2
+    assert [result.id for result in results] == list(range(6))
+    assert [result.id for result in results if not result.ok] == [3]
+    assert results[3].error == "timeout"
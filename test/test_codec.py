@@ -0,0 +1,66 @@
+import pytest
+
+from pv_prompt.dongle.codec import (
+    ActivateScene,
+    CodecError,
+    FrameDecoder,
+    GroupAdd,
+    Move,
+    MotorType,
+    NetworkAdd,
+    Unknown,
+    decode,
+    encode_frame,
+    split_frames,
+)
+from pv_prompt.dongle.nordic import Nd
+
+
+def test_encode():
+    assert Move(Move.UP).encode() == Nd.open.value
+    assert Move(Move.STOP).encode() == Nd.stop.value
+    assert ActivateScene(5).encode() == b"\x00\x03SG\x05"
+    assert NetworkAdd().encode() + GroupAdd().encode() == Nd.CONNECT.value
+    assert MotorType(0xBE).encode() == Nd.M25S_VENETIAN_35MM.value
+
+
+@pytest.mark.parametrize(
+    "command", [_nd for _nd in Nd if not _nd == Nd.SET_DONGLE_ID]
+)
+def test_every_command_round_trips(command):
+    decoder = FrameDecoder()
+    messages = decoder.feed_messages(command.value)
+    assert [_message.encode() for _message in messages] == split_frames(
+        command.value
+    )
+    assert not any(isinstance(_message, Unknown) for _message in messages)
+
+
+def test_decode():
+    assert decode(Nd.close.value) == Move(Move.DOWN, 0)
+    assert decode(b"\x00\x03SG\x05") == ActivateScene(5)
+    assert repr(decode(b"\x00\x02#q")) == "Unknown(b'#q')"
+    with pytest.raises(CodecError):
+        decode(Nd.CONNECT.value)
+
+
+def test_partial_and_coalesced_reads():
+    decoder = FrameDecoder()
+    assert decoder.feed(b"\x00") == []
+    assert decoder.feed(b"\x03RU") == []
+    assert decoder.pending == 4
+    assert decoder.feed(b"\x00\x00\x01N\x00") == [Nd.open.value, b"\x00\x01N"]
+    assert decoder.feed_messages(b"\x01A") == [GroupAdd()]
+    assert decoder.pending == 0
+
+
+def test_split_frames():
+    assert split_frames(Nd.CONNECT.value) == [b"\x00\x01N", b"\x00\x01A"]
+    with pytest.raises(CodecError):
+        split_frames(b"\x00\x03R")
+
+
+def test_encode_frame_length():
+    assert encode_frame(b"") == b"\x00\x00"
+    with pytest.raises(CodecError):
+        encode_frame(bytes(0x10000))
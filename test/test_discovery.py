@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+from aiohttp import web
+
+from pv_prompt.discovery import DiscoveryEngine, HubInfo, SubnetScanner
+
+
+class FakeEngine(DiscoveryEngine):
+    answers = {"PowerView-Hub": ["10.0.0.2", "10.0.0.3"], "hub": ["10.0.0.4"]}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mdns_reported = threading.Event()
+        # both netbios queries have to be running at the same time to pass.
+        self.netbios_running = threading.Barrier(2, timeout=5)
+
+    async def _mdns(self):
+        self._found("10.0.0.2", "hub2", "mdns")
+
+    def _query_netbios(self, name):
+        self.netbios_running.wait()
+        assert self.mdns_reported.wait(5)
+        return self.answers[name]
+
+
+def test_discovery_streams_unique_hubs(loop):
+    engine = FakeEngine(timeout=1, loop=loop)
+
+    async def discover():
+        hubs = []
+        async for hub in engine.discover():
+            hubs.append(hub)
+            # the netbios queries only answer after the first hub is
+            # reported, so it must be yielded before they are done.
+            engine.mdns_reported.set()
+        return hubs
+
+    hubs = loop.run_until_complete(discover())
+
+    assert hubs == list(engine.hubs.values())
+    assert hubs[0] == HubInfo("10.0.0.2", "hub2", "mdns")
+    # the netbios queries race each other.
+    assert {hub.ip for hub in hubs[1:]} == {"10.0.0.3", "10.0.0.4"}
+
+
+def test_subnet_scan_finds_stub_hub(loop):
+    async def userdata(request):
+        return web.json_response({"userData": {"hubName": "U3R1Yg=="}})
+
+    app = web.Application()
+    app.router.add_get("/api/userdata", userdata)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+
+    found = []
+    scanner = SubnetScanner(found.append, timeout=0.5, port=port)
+    hubs = loop.run_until_complete(scanner.scan("127.0.0.0/29"))
+    loop.run_until_complete(runner.cleanup())
+
+    assert found == hubs
+    assert hubs == [HubInfo("127.0.0.1", "Stub", "scan")]
+
+
+def test_scan_hosts():
+    assert len(list(SubnetScanner.hosts("192.168.2.0/24"))) == 254
+    assert list(SubnetScanner.hosts("192.168.2.7/32")) == ["192.168.2.7"]
+
+
+def test_scan_rejects_large_networks():
+    assert len(list(SubnetScanner.hosts("10.0.0.0/22"))) == 1022
+    with pytest.raises(ValueError):
+        SubnetScanner.hosts("10.0.0.0/21")
+
+
+class CountingScanner(SubnetScanner):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.probed = []
+        self.running = 0
+        self.most_running = 0
+
+    async def _probe(self, session, ip):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0)
+        self.probed.append(ip)
+        self.running -= 1
+        if ip == "10.0.0.9":
+            return HubInfo(ip, "Hub", "scan")
+        return None
+
+
+def test_scan_probes_with_a_bounded_pool(loop):
+    scanner = CountingScanner(lambda hub: None, connections=4)
+
+    hubs = loop.run_until_complete(scanner.scan("10.0.0.0/26"))
+
+    assert scanner.most_running == 4
+    assert sorted(scanner.probed) == sorted(SubnetScanner.hosts("10.0.0.0/26"))
+    assert hubs == [HubInfo("10.0.0.9", "Hub", "scan")]
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from pv_prompt.dongle.dongle import (
+    NordicReadProblem,
+    State,
+    byte_to_string_rep,
+    hexdump,
+)
+from pv_prompt.dongle.nordic import Nd
+from pv_prompt.dongle.start import MainMenu
+from pv_prompt.dongle.codec import Move
+from pv_prompt.dongle.transport import SerialTransport
+
+
+def test_transport_reads_split_frames(loop, fake_dongle):
+    dongle = fake_dongle(answer=lambda frame: frame + frame, chunk=2)
+    transport = SerialTransport(loop, dongle.port)
+    transport.open()
+
+    async def _test():
+        transport.write(Nd.open.value)
+        first = await transport.read_frame(1)
+        second = await transport.read_frame(1)
+        return first, second
+
+    try:
+        assert loop.run_until_complete(_test()) == (
+            Nd.open.value,
+            Nd.open.value,
+        )
+    finally:
+        transport.close()
+
+
+def test_nordic_serial_write(loop, fake_dongle, nordic_serial):
+    dongle = fake_dongle()
+    nordic = nordic_serial(dongle)
+
+    async def _test():
+        response = await nordic.submit(Nd.CONNECT, Nd.CONNECT.value)
+        await nordic.write(Nd.JOG.value)
+        return response
+
+    assert loop.run_until_complete(_test()) == Nd.CONNECT.value
+    assert dongle.received == [b"\x00\x01N", b"\x00\x01A", Nd.JOG.value]
+    assert nordic.state == State.idle
+
+
+def test_batch_responses_are_correlated(loop, fake_dongle, nordic_serial):
+    answers = {Nd.open.value: b"\x00\x01o", Nd.close.value: b"\x00\x01c"}
+    dongle = fake_dongle(answer=answers.get, chunk=3)
+    nordic = nordic_serial(dongle, max_in_flight=4)
+
+    async def _test():
+        futures = nordic.submit_batch(
+            [Nd.open, (Nd.close.value, b"\x00\x01c"), Move(Move.UP)]
+        )
+        return await asyncio.gather(*futures)
+
+    assert loop.run_until_complete(_test()) == [
+        b"\x00\x01o",
+        b"\x00\x01c",
+        b"\x00\x01o",
+    ]
+    assert dongle.received == [Nd.open.value, Nd.close.value, Nd.open.value]
+
+
+def test_wrong_response_fails_its_future(loop, fake_dongle, nordic_serial):
+    dongle = fake_dongle()
+    nordic = nordic_serial(dongle)
+
+    async def _test():
+        wrong, right = nordic.submit_batch(
+            [(Nd.open.value, b"\x00\x01x"), Nd.close]
+        )
+        with pytest.raises(NordicReadProblem):
+            await wrong
+        return await right
+
+    assert loop.run_until_complete(_test()) == Nd.close.value
+
+
+def test_missing_response_times_out(loop, fake_dongle, nordic_serial):
+    dongle = fake_dongle(answer=lambda frame: b"")
+    nordic = nordic_serial(dongle)
+    nordic.response_timeout = 0.1
+
+    async def _test():
+        with pytest.raises(NordicReadProblem):
+            await nordic.submit(Nd.open)
+
+    loop.run_until_complete(_test())
+    assert nordic.state == State.disconnected
+
+
+def test_command_after_a_timeout_reconnects(loop, fake_dongle, nordic_serial):
+    dongle = fake_dongle(
+        answer=lambda frame: b"" if frame == Nd.JOG.value else frame
+    )
+    nordic = nordic_serial(dongle)
+    nordic.response_timeout = 0.1
+
+    async def _test():
+        jog, opened = nordic.submit_batch([Nd.JOG, Nd.open])
+        with pytest.raises(NordicReadProblem):
+            await jog
+        return await opened
+
+    assert loop.run_until_complete(_test()) == Nd.open.value
+    assert dongle.received == [Nd.JOG.value, Nd.open.value]
+    assert nordic.connected
+
+
+def test_fire_and_forget_is_not_resent(loop, fake_dongle, nordic_serial):
+    dongle = fake_dongle(
+        answer=lambda frame: b"" if frame == Nd.JOG.value else frame
+    )
+    nordic = nordic_serial(dongle)
+    nordic.response_timeout = 0.1
+
+    async def _test():
+        jogged = await nordic.write(Nd.JOG.value, expect_response=False)
+        opened = await nordic.submit(Nd.open)
+        return jogged, opened
+
+    assert loop.run_until_complete(_test()) == (None, Nd.open.value)
+    assert dongle.received == [Nd.JOG.value, Nd.open.value]
+    assert nordic.connected
+
+
+def test_reconnecting_closes_the_old_connection(loop, fake_dongle):
+    dongle = fake_dongle()
+    menu = MainMenu(loop, dongle.port, frame_spacing=0)
+    try:
+        loop.run_until_complete(menu._connect_dongle())
+        old = menu.s
+        loop.run_until_complete(menu._connect_dongle())
+        loop.run_until_complete(asyncio.sleep(0))
+        assert old.connector_task.cancelled()
+        assert old.writer_task.cancelled()
+        assert not old.connected
+        assert menu.s.connected
+    finally:
+        menu.s.close()
+        loop.run_until_complete(asyncio.sleep(0))
+
+
+def test_byte_to_string_rep():
+    assert byte_to_string_rep(Nd.open.value) == "0x00x3RU0x0"
+    assert byte_to_string_rep(bytearray(b"\x00\x01z")) == "0x00x1z"
+    assert byte_to_string_rep(b"\xff ~\x7f") == "0xff ~0x7f"
+    assert byte_to_string_rep(b"") == ""
+
+
+def test_hexdump():
+    assert hexdump(b"\x00\x03RU\x00", width=4) == [
+        "0000  00 03 52 55  ..RU",
+        "0004  00           .",
+    ]
@@ -0,0 +1,25 @@
+import asyncio
+
+from pv_prompt.hub import HubRegistry
+
+
+def test_registry_shares_one_websession():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    hubs = HubRegistry(loop, use_snapshot=False)
+
+    async def _run():
+        hub_1 = hubs.add("http://10.0.0.1")
+        hub_2 = hubs.add("10.0.0.2")
+        assert hubs.current is hub_2
+        assert hubs.add("10.0.0.1/") is hub_1
+        assert hubs.switch("10.0.0.2") is hub_2
+        assert "http://10.0.0.1" in hubs
+        assert len(hubs) == 2
+        assert hub_1.request.websession is hub_2.request.websession
+        websession = hubs.websession
+        await hubs.close()
+        assert websession.closed
+
+    loop.run_until_complete(_run())
+    loop.close()
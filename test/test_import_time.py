@@ -0,0 +1,45 @@
+"""Guard the modules imported by the console scripts at startup.
+
+Heavy modules must only be imported when the command needing them is
+used. The set of imported modules is checked, not the time taken, which
+varies too much between machines."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("pygments", "nmb", "smb", "asyncdns", "serial")
+
+SCRIPT = """
+import json, sys
+import {module}
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def imported_modules(module) -> list:
+    """The modules loaded by importing module in a fresh interpreter."""
+    output = subprocess.check_output(
+        [sys.executable, "-c", SCRIPT.format(module=module)]
+    )
+    return json.loads(output.decode())
+
+
+@pytest.mark.parametrize(
+    "module", ["pv_prompt.async_prompt", "pv_prompt.dongle.start"]
+)
+def test_startup_imports_no_heavy_modules(module):
+    loaded = [
+        name
+        for name in imported_modules(module)
+        if name.split(".")[0] in HEAVY_MODULES
+    ]
+    assert loaded == []
+
+
+def test_discovery_is_imported_on_use():
+    assert "pv_prompt.discovery" not in imported_modules(
+        "pv_prompt.async_prompt"
+    )
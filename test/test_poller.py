@@ -0,0 +1,60 @@
+import asyncio
+
+from pv_prompt.poller import ShadePoller
+from pv_prompt.resource_cache import HubCache
+
+
+def test_poll_moved_shades(loop, fake_request):
+    fake_request.delay = 0
+    hub_cache = HubCache(fake_request, loop)
+    loop.run_until_complete(hub_cache.update(quiet=True))
+    poller = ShadePoller(hub_cache, battery_interval=1e6)
+
+    fake_request.positions = {1: {"posKind1": 1, "position1": 100}}
+    poller.kick(1, 2)
+    assert poller.interval == poller.fast_interval
+    loop.run_until_complete(poller.poll())
+
+    assert [update.shade_id for update in poller.feed] == [1]
+    assert poller.feed[0].positions == {"posKind1": 1, "position1": 100}
+    assert (
+        hub_cache.shades.find_by_id(1).raw_data["positions"]["position1"]
+        == 100
+    )
+
+
+def run_poller(loop, poller, poll):
+    poller.poll = poll
+    poller.start()
+    loop.run_until_complete(asyncio.sleep(0.05))
+    poller.stop()
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+def test_poller_keeps_running_after_an_error(loop, fake_request, caplog):
+    poller = ShadePoller(HubCache(fake_request, loop), slow_interval=0.01)
+    polls = []
+
+    async def _poll():
+        polls.append(len(polls))
+        if len(polls) == 1:
+            raise KeyError("positions")
+
+    run_poller(loop, poller, _poll)
+    assert len(polls) > 1
+    assert "Polling shades failed." in caplog.text
+
+
+def test_kick_during_a_poll_is_not_lost(loop, fake_request):
+    poller = ShadePoller(
+        HubCache(fake_request, loop), fast_interval=60, slow_interval=60
+    )
+    polls = []
+
+    async def _poll():
+        polls.append(len(polls))
+        if len(polls) == 1:
+            poller.kick(1)
+
+    run_poller(loop, poller, _poll)
+    assert polls == [0, 1]
@@ -0,0 +1,50 @@
+import json
+
+from prompt_toolkit.formatted_text import fragment_list_to_text
+
+from pv_prompt.print_output import Table, json_fragments, print_dicts
+
+
+def test_table_column_widths_follow_data():
+    table = Table("NAME", "ID")
+    table.add_rows([("Living room & kitchen", 1), ("<b>", 12345)])
+    assert table.widths() == [23, 7]
+
+    lines = fragment_list_to_text(table.fragments()).splitlines()
+    assert lines[1] == "  NAME                   ID     "
+    assert lines[3] == "  Living room & kitchen  1      "
+    assert lines[4] == "  <b>                    12345  "
+    assert lines[-2] == "  2 items found."
+
+
+def test_table_page():
+    table = Table("ID")
+    table.add_rows((_id,) for _id in range(10))
+    text = fragment_list_to_text(table.fragments(4, 6, footer=False))
+    assert text.split() == ["ID", "--", "4", "5"]
+
+
+def test_json_fragments():
+    data = {"name": 'a "b": c', "ids": [1, -2.5e3, True, None], "room": {}}
+    fragments = list(json_fragments(data))
+    assert "".join(text for _, text in fragments) == json.dumps(data, indent=4)
+    styles = dict((text, style) for style, text in fragments)
+    assert styles['"name"'] == "class:pygments.name.tag"
+    assert styles['"a \\"b\\": c"'] == "class:pygments.literal.string.double"
+    assert styles["-2500.0"] == "class:pygments.literal.number.float"
+    assert styles["true"] == "class:pygments.keyword.constant"
+
+
+def test_print_dicts_plain(capsys):
+    print_dicts([{"id": 1}, {"id": 2}], plain=True)
+    assert capsys.readouterr().out == '{\n    "id": 1\n}\n{\n    "id": 2\n}\n'
+
+
+def test_json_fragments_nested_keys():
+    data = {"a": [{"b": "c"}, {"d": {"e": 1}}], 2: "2"}
+    fragments = list(json_fragments(data))
+    assert "".join(text for _, text in fragments) == json.dumps(data, indent=4)
+    keys = [
+        text for style, text in fragments if style == "class:pygments.name.tag"
+    ]
+    assert keys == ['"a"', '"b"', '"d"', '"e"', '"2"']
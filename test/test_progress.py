@@ -0,0 +1,115 @@
+import asyncio
+import io
+import re
+
+from prompt_toolkit.layout.screen import Size
+from prompt_toolkit.output.defaults import (
+    get_default_output,
+    set_default_output,
+)
+from prompt_toolkit.output.vt100 import Vt100_Output
+
+from pv_prompt import bulk, progress
+from pv_prompt.print_output import info, warn
+from pv_prompt.progress import Progress
+
+
+class Shade:
+    def __init__(self, _id):
+        self.id = _id
+        self.name = "shade {}".format(_id)
+
+    async def open(self):
+        await asyncio.sleep(0.02)
+
+
+def test_concurrent_operations_share_one_refresh_task(loop):
+    output = io.StringIO()
+    progress = Progress(output, interval=0.01, redraw=True)
+
+    async def _run(name, shades):
+        with progress.operation(name, total=len(shades)) as op:
+            return await bulk.open_shades(shades, progress=op)
+
+    async def _both():
+        first = asyncio.ensure_future(_run("first", [Shade(1), Shade(2)]))
+        await asyncio.sleep(0)
+        task = progress._task
+        second = asyncio.ensure_future(_run("second", [Shade(3)]))
+        await asyncio.sleep(0.01)
+        assert progress._task is task
+        assert len(progress.operations) == 2
+        await asyncio.gather(first, second)
+
+    loop.run_until_complete(_both())
+    text = output.getvalue()
+    assert "    1 shade 1" in text
+    assert "  first 2/2 done in" in text
+    assert "  second 1/1 done in" in text
+    assert progress.operations == []
+
+
+def test_without_terminal_only_summaries_are_printed(loop):
+    output = io.StringIO()
+    progress = Progress(output)
+
+    async def _run():
+        with progress.operation("getting hub data"):
+            await asyncio.sleep(0.01)
+
+    loop.run_until_complete(_run())
+    assert progress._task is None
+    assert output.getvalue().startswith("  getting hub data done in")
+    assert output.getvalue().count("\n") == 1
+
+
+_ESCAPE = re.compile(r"\x1b\[([?\d;]*)([A-Za-z])|\n|[^\x1b\r\n]+")
+
+
+def screen(text) -> list:
+    """The lines left on a terminal after writing text to it."""
+    lines = [""]
+    row = 0
+    for match in _ESCAPE.finditer(text):
+        if match.group(0) == "\n":
+            row += 1
+            if row == len(lines):
+                lines.append("")
+        elif match.group(2) == "F":
+            row -= int(match.group(1) or 1)
+            lines[row] = ""
+        elif match.group(2) == "J":
+            del lines[row + 1 :]
+            lines[row] = ""
+        elif match.group(2) is None:
+            lines[row] += match.group(0)
+    return [_line for _line in lines if _line]
+
+
+def test_output_during_an_operation_is_kept(loop, monkeypatch):
+    output = io.StringIO()
+    monkeypatch.setattr(progress, "_PROGRESS", Progress(output, redraw=True))
+    previous = get_default_output()
+    set_default_output(
+        Vt100_Output(
+            output, lambda: Size(rows=40, columns=120), write_binary=False
+        )
+    )
+
+    async def _run():
+        with progress.operation("getting shades") as op:
+            op.begin("shade 1")
+            warn("Problem getting shades")
+            progress._PROGRESS.draw()
+            info("still going")
+            progress._PROGRESS.draw()
+
+    try:
+        loop.run_until_complete(_run())
+    finally:
+        set_default_output(previous)
+    lines = screen(output.getvalue())
+    assert lines[0] == "  Problem getting shades"
+    assert lines[1] == "  still going"
+    assert lines[2].startswith("  getting shades done in")
+    assert len(lines) == 3
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from pv_prompt.dongle.dongle import NordicSerial
+from pv_prompt.dongle.nordic import Nd
+from pv_prompt.dongle.recorder import (
+    INCOMING,
+    OUTGOING,
+    LogError,
+    Record,
+    Recorder,
+    read_log,
+    replay,
+)
+
+SESSION = [
+    Record(0.0, INCOMING, b"\x00\x01z"),
+    Record(1.0, OUTGOING, Nd.open.value),
+    Record(1.1, INCOMING, b"\x00\x01o"),
+    Record(3.0, OUTGOING, Nd.close.value),
+    Record(3.2, INCOMING, b"\x00\x01c"),
+]
+
+
+def test_record_session(loop, tmpdir, fake_dongle, nordic_serial):
+    path = str(tmpdir.join("session.log"))
+    dongle = fake_dongle()
+    nordic = nordic_serial(dongle)
+    recorder = Recorder(path, loop)
+    recorder.record(nordic.message_queue)
+
+    async def _test():
+        await asyncio.gather(*nordic.submit_batch([Nd.open, Nd.CONNECT]))
+
+    try:
+        loop.run_until_complete(_test())
+    finally:
+        recorder.close()
+
+    _, records = read_log(path)
+    assert [(_r.direction, _r.frame) for _r in records] == [
+        (OUTGOING, Nd.open.value),
+        (INCOMING, Nd.open.value),
+        (OUTGOING, b"\x00\x01N"),
+        (INCOMING, b"\x00\x01N"),
+        (OUTGOING, b"\x00\x01A"),
+        (INCOMING, b"\x00\x01A"),
+    ]
+    times = [_r.time for _r in records]
+    assert times == sorted(times)
+
+
+def test_read_log_cut_short(tmpdir):
+    path = tmpdir.join("session.log")
+    path.write_binary(b"PVDL")
+    with pytest.raises(LogError):
+        read_log(str(path))
+
+
+def test_replay_accelerated(loop):
+    result = loop.run_until_complete(replay(loop, SESSION, speed=10))
+    assert result.frames == 2
+    assert result.mismatches == []
+    assert result.errors == 0
+    assert 0.3 <= result.duration < 1
+
+
+def test_replay_frame_without_reply(loop, monkeypatch):
+    monkeypatch.setattr(NordicSerial, "response_timeout", 0.1)
+    records = SESSION[:3] + [Record(2.0, OUTGOING, Nd.JOG.value)] + SESSION[3:]
+    result = loop.run_until_complete(replay(loop, records, speed=None))
+    assert result.frames == 3
+    assert result.mismatches == []
+    assert result.errors == 0
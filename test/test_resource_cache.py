@@ -0,0 +1,187 @@
+import asyncio
+import copy
+import json
+
+import pytest
+from aiopvapi.helpers.aiorequest import PvApiConnectionError
+
+from pv_prompt.base_prompts import InvalidIdException
+from pv_prompt.resource_cache import HubCache
+from pv_prompt.snapshot import SNAPSHOT_VERSION
+
+
+def test_update_is_concurrent_and_capped(loop, fake_request):
+    hub_cache = HubCache(fake_request, loop, concurrency=2)
+    loop.run_until_complete(hub_cache.update())
+
+    assert fake_request.max_in_flight == 2
+    assert len(fake_request.urls) == 5
+    assert len(hub_cache.shades) == 2
+    assert hub_cache.rooms.get_name_by_id(11) == "Room 2"
+    assert hub_cache.user_data.hub_name == "Hub"
+    assert set(hub_cache.timings) == {
+        "shades",
+        "rooms",
+        "scenes",
+        "scene_members",
+        "user_data",
+    }
+
+
+def test_update_only_fetches_stale_collections(loop, fake_request):
+    hub_cache = HubCache(fake_request, loop, ttl=60)
+    loop.run_until_complete(hub_cache.update())
+    assert len(fake_request.urls) == 5
+
+    loop.run_until_complete(hub_cache.update())
+    assert len(fake_request.urls) == 5
+
+    hub_cache.rooms.invalidate()
+    assert hub_cache.stale_collections() == ["rooms"]
+    loop.run_until_complete(hub_cache.update())
+    assert len(fake_request.urls) == 6
+
+    loop.run_until_complete(hub_cache.refresh("shades"))
+    assert len(fake_request.urls) == 7
+
+
+def test_indexes(loop, fake_request):
+    hub_cache = HubCache(fake_request, loop)
+    loop.run_until_complete(hub_cache.update())
+
+    assert hub_cache.shades.find_by_id(2).name == "Shade 2"
+    assert [
+        shade.id for shade in hub_cache.shades.find_by_name("Shade 1")
+    ] == [1]
+    assert [
+        shade.id for shade in hub_cache.shades.list_resources(room_id=11)
+    ] == [2]
+    assert list(hub_cache.shades.list_resources(room_id=99)) == []
+    assert hub_cache.rooms.get_name_by_id(99) is None
+    with pytest.raises(InvalidIdException):
+        hub_cache.shades.find_by_id(99)
+
+
+def test_snapshot_round_trip(loop, tmp_path, fake_request):
+    path = str(tmp_path / "hub.json")
+    hub_cache = HubCache(fake_request, loop, snapshot_path=path)
+    loop.run_until_complete(hub_cache.update())
+
+    fake_request.urls.clear()
+    restored = HubCache(fake_request, loop, snapshot_path=path)
+    assert restored.load_snapshot()
+    assert restored.shades.find_by_id(1).name == "Shade 1"
+    assert restored.user_data.hub_name == "Hub"
+    assert restored.stale_collections() == []
+
+    loop.run_until_complete(restored.revalidate())
+    assert len(fake_request.urls) == 5
+
+
+def test_snapshot_with_other_version_is_ignored(loop, tmp_path, fake_request):
+    path = tmp_path / "hub.json"
+    path.write_text('{"version": -1, "collections": {}}')
+    hub_cache = HubCache(fake_request, loop, snapshot_path=str(path))
+    assert not hub_cache.load_snapshot()
+
+
+def test_refresh_only_updates_changed_resources(loop, fake_request, hub_data):
+    hub_cache = HubCache(fake_request, loop)
+    loop.run_until_complete(hub_cache.update())
+    shade_1 = hub_cache.shades.find_by_id(1)
+    shade_2 = hub_cache.shades.find_by_id(2)
+    completer = hub_cache.shades.id_suggestions
+
+    raw = hub_data["api/shades"]
+    raw["shadeData"][1]["roomId"] = 10
+    raw["shadeData"].append({"id": 3, "name": "U2hhZGUgMw==", "type": 6})
+    del raw["shadeData"][0]
+    changes = hub_cache.shades.load(raw)
+
+    assert changes == ([3], [1], [2])
+    assert hub_cache.shades.find_by_id(2) is shade_2
+    assert [shade.id for shade in hub_cache.shades.find_by_room_id(10)] == [2]
+    with pytest.raises(InvalidIdException):
+        hub_cache.shades.find_by_id(shade_1.id)
+    assert hub_cache.shades.id_suggestions is not completer
+
+    completer = hub_cache.shades.id_suggestions
+    assert not hub_cache.shades.load(copy.deepcopy(raw))
+    assert hub_cache.shades.id_suggestions is completer
+
+
+def test_concurrent_fetches_share_one_request(loop, fake_request):
+    hub_cache = HubCache(fake_request, loop)
+
+    async def _fetch():
+        return await asyncio.gather(
+            hub_cache.shades.fetch(),
+            hub_cache.shades.get_resource(),
+            hub_cache.update("shades", force=True, quiet=True),
+            hub_cache.user_data.fetch(),
+            hub_cache.user_data.fetch(),
+        )
+
+    results = loop.run_until_complete(_fetch())
+    assert sorted(fake_request.urls) == [
+        "http://1.2.3.4/api/shades",
+        "http://1.2.3.4/api/userdata",
+    ]
+    assert results[0].added == [1, 2]
+
+    # a new fetch after the previous one finished sends a new request.
+    loop.run_until_complete(hub_cache.shades.fetch())
+    assert len(fake_request.urls) == 3
+
+
+def test_resources_are_updated_after_the_indexes(loop, fake_request, hub_data):
+    hub_cache = HubCache(fake_request, loop)
+    loop.run_until_complete(hub_cache.update())
+    shade_2 = hub_cache.shades.find_by_id(2)
+
+    raw = hub_data["api/shades"]
+    raw["shadeData"][1]["name_unicode"] = "Renamed"
+    # an unhashable room id fails building the indexes.
+    raw["shadeData"][1]["roomId"] = [10]
+    with pytest.raises(TypeError):
+        hub_cache.shades.load(raw)
+    assert shade_2.name == "Shade 2"
+
+    raw["shadeData"][1]["roomId"] = 10
+    assert hub_cache.shades.load(raw).modified == [2]
+    assert hub_cache.shades.find_by_name("Renamed") == [shade_2]
+    assert shade_2 in hub_cache.shades.find_by_room_id(10)
+
+
+def test_snapshot_of_another_hub_is_discarded(loop, tmp_path, fake_request):
+    path = tmp_path / "hub.json"
+    path.write_text(
+        json.dumps(
+            {
+                "version": SNAPSHOT_VERSION,
+                "serial": "OTHER HUB",
+                "collections": {
+                    "shades": {
+                        "shadeIds": [99],
+                        "shadeData": [{"id": 99, "name": "", "type": 6}],
+                    }
+                },
+            }
+        )
+    )
+    fetch = fake_request.get
+
+    async def _get(url, params=None):
+        if url.endswith("api/shades"):
+            raise PvApiConnectionError()
+        return await fetch(url, params)
+
+    fake_request.get = _get
+    hub_cache = HubCache(fake_request, loop, snapshot_path=str(path))
+    assert hub_cache.load_snapshot()
+    assert hub_cache.shades.get_by_id(99) is not None
+
+    loop.run_until_complete(hub_cache.revalidate())
+    assert hub_cache.shades.get_by_id(99) is None
+    assert hub_cache.stale_collections() == ["shades"]
+    assert fake_request.urls.count("http://1.2.3.4/api/userdata") == 1
@@ -0,0 +1,55 @@
+from pv_prompt.resource_cache import HubCache
+
+POSITIONS = {"posKind1": 1, "position1": 65535}
+
+
+def test_scene_membership(loop, fake_request):
+    hub_cache = HubCache(fake_request, loop)
+    loop.run_until_complete(hub_cache.update())
+    index = hub_cache.scene_index
+
+    assert [scene.id for scene in index.scenes_with_shade(1)] == [20]
+    assert index.scenes_with_shade(2) == []
+    assert [shade.id for shade in index.shades_in_scene(20)] == [1]
+    assert index.positions(20) == {1: {}}
+    assert [shade.id for shade in index.shades_in_room(11)] == [2]
+    assert [scene.id for scene in index.scenes_in_room(10)] == [20]
+    assert index.dangling_members() == []
+    # unchanged collections reuse the index.
+    assert hub_cache.scene_index is index
+
+
+def test_index_is_rebuilt_after_changes(loop, fake_request):
+    hub_cache = HubCache(fake_request, loop)
+    loop.run_until_complete(hub_cache.update())
+    index = hub_cache.scene_index
+
+    hub_cache.scene_members.load(
+        {
+            "sceneMemberData": [
+                {
+                    "id": 30,
+                    "sceneId": 20,
+                    "shadeId": 1,
+                    "positions": POSITIONS,
+                },
+                {
+                    "id": 31,
+                    "sceneId": 20,
+                    "shadeId": 2,
+                    "positions": POSITIONS,
+                },
+                {
+                    "id": 32,
+                    "sceneId": 21,
+                    "shadeId": 2,
+                    "positions": POSITIONS,
+                },
+            ]
+        }
+    )
+    rebuilt = hub_cache.scene_index
+    assert rebuilt is not index
+    assert rebuilt.position(20, 1) == POSITIONS
+    assert [scene.id for scene in rebuilt.scenes_with_shade(2)] == [20]
+    assert [member.id for member in rebuilt.dangling_members()] == [32]
@@ -0,0 +1,161 @@
+import asyncio
+
+from pv_prompt.bulk import run_bulk
+from pv_prompt.scheduler import ScheduledRequest, TokenBucket, background
+
+
+class RecordingRequest(ScheduledRequest):
+    """Records the requests instead of sending them to a hub."""
+
+    def __init__(self, loop, **kwargs):
+        super().__init__("1.2.3.4", loop=loop, websession=object(), **kwargs)
+        self.sent = []
+
+    async def _send(self, method, url, **kwargs):
+        self.sent.append((method, url, kwargs))
+        await asyncio.sleep(0.01)
+        return {"url": url}
+
+
+class FakeResource:
+    def __init__(self, id_):
+        self.id = id_
+        self.name = "shade {}".format(id_)
+
+
+def move(request, shade_id, position):
+    data = {"shade": {"positions": {"posKind1": 1, "position1": position}}}
+    return request.put("http://1.2.3.4/api/shades/{}".format(shade_id), data)
+
+
+def test_interactive_requests_go_first(loop):
+    request = RecordingRequest(loop, max_in_flight=1)
+
+    async def _run():
+        refreshes = [
+            asyncio.ensure_future(request.get("http://1.2.3.4/api/shades"))
+            for _ in range(3)
+        ]
+        # let the first refresh start.
+        await asyncio.sleep(0.001)
+        stop = request.put(
+            "http://1.2.3.4/api/shades/1", {"shade": {"motion": "stop"}}
+        )
+        await asyncio.gather(stop, *refreshes)
+
+    loop.run_until_complete(_run())
+    assert [method for method, _, _ in request.sent] == [
+        "get",
+        "put",
+        "get",
+        "get",
+    ]
+    request.stop()
+
+
+def test_background_requests_go_last(loop):
+    request = RecordingRequest(loop, max_in_flight=1)
+
+    async def _poll():
+        with background():
+            await request.get("http://1.2.3.4/api/shades/1")
+
+    async def _run():
+        await asyncio.gather(
+            request.get("http://1.2.3.4/api/rooms"),
+            _poll(),
+            request.get("http://1.2.3.4/api/shades"),
+        )
+
+    loop.run_until_complete(_run())
+    assert [url for _, url, _ in request.sent] == [
+        "http://1.2.3.4/api/rooms",
+        "http://1.2.3.4/api/shades",
+        "http://1.2.3.4/api/shades/1",
+    ]
+    request.stop()
+
+
+def test_moves_of_one_shade_collapse(loop):
+    request = RecordingRequest(loop, max_in_flight=1)
+
+    async def _run():
+        return await asyncio.gather(
+            request.get("http://1.2.3.4/api/rooms"),
+            move(request, 1, 100),
+            move(request, 2, 100),
+            move(request, 1, 200),
+            move(request, 1, 300),
+        )
+
+    results = loop.run_until_complete(_run())
+    moves = [
+        kwargs["data"] for method, _, kwargs in request.sent if method == "put"
+    ]
+    assert len(moves) == 2
+    assert moves[0]["shade"]["positions"]["position1"] == 300
+    # every caller gets the outcome of the move sent.
+    assert results[1] == results[3] == results[4]
+    request.stop()
+
+
+def test_moves_do_not_collapse_over_a_stop(loop):
+    request = RecordingRequest(loop, max_in_flight=1)
+    stop = {"shade": {"motion": "stop"}}
+
+    async def _run():
+        await asyncio.gather(
+            request.get("http://1.2.3.4/api/rooms"),
+            move(request, 1, 100),
+            request.put("http://1.2.3.4/api/shades/1", stop),
+            move(request, 1, 300),
+        )
+
+    loop.run_until_complete(_run())
+    moves = [
+        kwargs["data"] for method, _, kwargs in request.sent if method == "put"
+    ]
+    assert moves == [
+        {"shade": {"positions": {"posKind1": 1, "position1": 100}}},
+        stop,
+        {"shade": {"positions": {"posKind1": 1, "position1": 300}}},
+    ]
+    request.stop()
+
+
+def test_single_commands_overtake_bulk_moves(loop):
+    request = RecordingRequest(loop, max_in_flight=1)
+
+    async def _run():
+        moves = asyncio.ensure_future(
+            run_bulk(
+                [FakeResource(_id) for _id in range(1, 4)],
+                lambda resource: move(request, resource.id, 100),
+            )
+        )
+        await asyncio.sleep(0.001)
+        await request.put(
+            "http://1.2.3.4/api/shades/9", {"shade": {"motion": "stop"}}
+        )
+        await moves
+
+    loop.run_until_complete(_run())
+    assert [url.rsplit("/", 1)[-1] for _, url, _ in request.sent] == [
+        "1",
+        "9",
+        "2",
+        "3",
+    ]
+    request.stop()
+
+
+def test_token_bucket_limits_rate(loop):
+    bucket = TokenBucket(rate=100, burst=2)
+
+    async def _run():
+        start = loop.time()
+        for _ in range(6):
+            await bucket.acquire()
+        return loop.time() - start
+
+    assert loop.run_until_complete(_run()) >= 0.035
@@ -0,0 +1,86 @@
+from aiopvapi.helpers.aiorequest import PvApiConnectionError
+
+from benchmarks.fake_hub import FakeHub
+from pv_prompt.scheduler import ScheduledRequest
+from pv_prompt.stats import LatencyHistogram, RequestStats, endpoint_name
+from test.test_scheduler import RecordingRequest
+
+
+def test_endpoint_name():
+    assert endpoint_name("get", "http://1.2.3.4/api/shades/12") == (
+        "GET /api/shades/{id}"
+    )
+    assert endpoint_name(
+        "get", "http://1.2.3.4/api/scenes", {"sceneId": 3}
+    ) == ("GET /api/scenes?sceneId")
+
+
+def test_percentiles():
+    histogram = LatencyHistogram()
+    for _ms in range(1, 101):
+        histogram.record(_ms / 1000)
+    assert histogram.count == 100
+    assert 0.050 <= histogram.percentile(50) <= 0.050 * 1.1
+    assert 0.099 <= histogram.percentile(99) <= 0.100
+    assert histogram.percentile(100) == 0.1
+
+
+def test_record_errors():
+    stats = RequestStats("1.2.3.4")
+    stats.record("get", "http://1.2.3.4/api/rooms", duration=0.1, received=10)
+    stats.record(
+        "get",
+        "http://1.2.3.4/api/rooms",
+        duration=0.2,
+        error=PvApiConnectionError(),
+    )
+    data = stats.to_dict()["endpoints"]["GET /api/rooms"]
+    assert data["requests"] == 2
+    assert data["errors"] == {"PvApiConnectionError": 1}
+    assert data["bytes_received"] == 10
+
+
+class FlakyRequest(RecordingRequest):
+    async def _send(self, method, url, **kwargs):
+        await super()._send(method, url, **kwargs)
+        if len(self.sent) == 1:
+            raise PvApiConnectionError()
+        return {"shadeIds": []}
+
+
+def test_connection_errors_are_retried_and_recorded(loop):
+    request = FlakyRequest(loop)
+    result = loop.run_until_complete(request.get("http://1.2.3.4/api/shades"))
+    request.stop()
+
+    assert result == {"shadeIds": []}
+    stats = request.stats.endpoint("get", "http://1.2.3.4/api/shades")
+    assert stats.requests == 2
+    assert stats.retries == 1
+    assert stats.errors == {"PvApiConnectionError": 1}
+
+
+def test_transferred_bytes_are_recorded(loop):
+    hub = FakeHub(shades=2)
+
+    async def _run():
+        address = await hub.start()
+        request = ScheduledRequest(address, loop=loop)
+        url = "http://{}/api/shades".format(address)
+        try:
+            await request.get(url)
+            await request.put(url + "/1", {"shade": {"motion": "stop"}})
+            async with request.websession.get(url) as response:
+                body = await response.read()
+        finally:
+            request.stop()
+            await request.websession.close()
+            await hub.stop()
+        return request.stats, url, body
+
+    stats, url, body = loop.run_until_complete(_run())
+    assert stats.endpoint("get", url).bytes_received == len(body)
+    assert stats.endpoint("get", url).bytes_sent == 0
+    assert stats.endpoint("put", url + "/1").bytes_sent == len(
+        b'{"shade": {"motion": "stop"}}'
+    )